@@ -0,0 +1,84 @@
+"""Benchmark sentence generation: markovify's chain vs the compiled ones.
+
+Models are trained on a corpus file (one text per line) or a generated one,
+then sentences per second are measured for raw chain walks, which is what
+the compiled chains speed up, and for make_sentence(), which also tests
+every sentence for overlap with the corpus, as rejection sampling does.
+
+    python benchmarks/generation.py [--corpus FILE] [--sentences N]
+"""
+
+import random
+import time
+import tracemalloc
+
+import click
+import markovify
+
+from subreddit_simulator.models import SubredditSimulatorText
+
+WORDS = 5000
+
+
+def generated_corpus(num_texts, seed=0):
+    """Return texts of words drawn from a Zipf-like distribution."""
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(WORDS)]
+    weights = [1 / (rank + 1) for rank in range(WORDS)]
+    texts = []
+    for _ in range(num_texts):
+        sentences = []
+        for _ in range(rng.randint(1, 4)):
+            sentence = rng.choices(words, weights, k=rng.randint(5, 25))
+            sentences.append(" ".join(sentence).capitalize() + ".")
+        texts.append(" ".join(sentences))
+    return texts
+
+
+def measure(function, num_sentences):
+    started = time.perf_counter()
+    for _ in range(num_sentences):
+        function()
+    return num_sentences / (time.perf_counter() - started)
+
+
+def build(name, texts, state_size):
+    tracemalloc.start()
+    if name == "markovify":
+        model = markovify.Text(" ".join(texts), state_size=state_size)
+    else:
+        model = SubredditSimulatorText.from_texts(
+            dict(enumerate(texts)), state_size=state_size
+        )
+        if name == "compact":
+            model.compact()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return model, size
+
+
+@click.command()
+@click.option("--corpus", type=click.File(encoding="utf-8"), help="One text per line.")
+@click.option("--texts", default=20000, help="Number of generated texts.")
+@click.option("--state-size", default=2)
+@click.option("--sentences", default=20000, help="Sentences per measure.")
+def main(corpus, texts, state_size, sentences):
+    texts = (
+        [line for line in corpus if line.strip()] if corpus else generated_corpus(texts)
+    )
+    click.echo(f"{len(texts)} texts, state size {state_size}")
+
+    for name in ("markovify", "compiled", "compact"):
+        model, size = build(name, texts, state_size)
+        random.seed(0)
+        walks = measure(model.chain.walk, sentences)
+        random.seed(0)
+        made = measure(lambda: model.make_sentence(tries=1), max(sentences // 10, 1))
+        click.echo(
+            f"{name:>10}: {walks:>9.0f} walks/s, {made:>8.0f} make_sentence/s, "
+            f"{size / 2 ** 20:>7.1f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark the normalization of comment / submission HTML bodies.
+
+Bodies are read from a corpus file (one HTML body per line) or generated
+like the reddit ones, then texts per second are measured one at a time,
+with a single normalizer for the whole batch, and in worker processes, as
+--import-corpus does with import_processes.
+
+    python benchmarks/normalize_html.py [--corpus FILE] [--processes N]...
+"""
+
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+
+from subreddit_simulator.models import (
+    HTMLNormalizer,
+    normalize_html_text,
+    normalize_html_texts,
+)
+
+WORDS = 2000
+BLOCKS = (
+    "<p>{}</p>",
+    "<p>{} <em>{}</em> {}</p>",
+    '<p>{} <a href="https://example.com/?a=1&amp;b=2">{}</a> {}</p>',
+    "<blockquote><p>{}</p></blockquote>",
+    "<ul><li>{}</li><li>{}</li></ul>",
+    "<pre><code>{}</code></pre>",
+    "<p>{} &lt; {} &amp;&amp; {} &gt; 3</p>",
+)
+
+
+def generated_corpus(num_texts, seed=0):
+    """Return reddit-style HTML bodies of random words."""
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(WORDS)]
+
+    def sentence():
+        return " ".join(rng.choices(words, k=rng.randint(3, 15)))
+
+    texts = []
+    for _ in range(num_texts):
+        blocks = []
+        for block in rng.choices(BLOCKS, k=rng.randint(1, 5)):
+            blocks.append(block.format(*(sentence() for _ in range(block.count("{}")))))
+        texts.append(f'<div class="md">{"".join(blocks)}</div>')
+    return texts
+
+
+def measure(function, texts):
+    started = time.perf_counter()
+    function(texts)
+    return len(texts) / (time.perf_counter() - started)
+
+
+@click.command()
+@click.option("--corpus", type=click.File(encoding="utf-8"), help="One body per line.")
+@click.option("--texts", default=50000, help="Number of generated bodies.")
+@click.option(
+    "--processes", "-p", multiple=True, type=int, default=(2, 4), show_default=True
+)
+def main(corpus, texts, processes):
+    texts = (
+        [line for line in corpus if line.strip()] if corpus else generated_corpus(texts)
+    )
+    click.echo(f"{len(texts)} texts")
+
+    runs = [
+        ("one at a time", lambda texts: [normalize_html_text(t) for t in texts]),
+        ("normalize_all", HTMLNormalizer().normalize_all),
+    ]
+    for name, function in runs:
+        click.echo(f"{name:>16}: {measure(function, texts):>9.0f} texts/s")
+
+    for num_processes in processes:
+        with ProcessPoolExecutor(num_processes) as executor:
+            # Start the workers before measuring.
+            normalize_html_texts(texts[:num_processes], executor)
+            rate = measure(lambda texts: normalize_html_texts(texts, executor), texts)
+        click.echo(f"{f'{num_processes} processes':>16}: {rate:>9.0f} texts/s")
+
+
+if __name__ == "__main__":
+    main()
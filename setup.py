@@ -18,11 +18,14 @@ setup(
         "pipenv",
         "colorama",
         "praw",
+        # Account tokens are cached using prawcore internals.
+        "prawcore>=1.0,<2",
         "attrs",
         "markovify",
         "requests",
         "SQLAlchemy",
     ],
+    extras_require={"zstd": ["zstandard"]},
     py_modules=["subreddit_simulator"],
     entry_points="""
     [console_scripts]
@@ -9,9 +9,9 @@ from typing import IO, Callable, Tuple
 import attr
 import click
 
-from . import __version__
+from . import __version__, corpus, retention
 from .config import DEFAULT_SUBREDDIT_SIMULATOR_CONFIG, Config
-from .database import Engine
+from .database import Engine, upgrade_schema
 from .models import Base
 from .subreddit_simulator import Simulator
 from .utils import ColorStreamHandler, echo, separator
@@ -135,6 +135,103 @@ def run_main_loop(config: Config, simulator: Simulator, verbose: int, output: IO
                     config=config,
                 )
 
+            if (
+                now - config.last_training >= config.training_delay_seconds
+                and config.training_delay_seconds > 0
+            ):
+                describe_command(
+                    "retrain models",
+                    "Models retrained",
+                    simulator.subreddit,
+                    verbose,
+                    prefix="${FG_CYAN}",
+                    output=output,
+                    callback=simulator.train_models,
+                    on_success_update="last_training",
+                    config=config,
+                )
+
+            if (
+                now - config.last_harvest >= config.harvest_delay_seconds
+                and config.harvest_delay_seconds > 0
+            ):
+                describe_command(
+                    "harvest comments and submissions",
+                    "Harvested",
+                    simulator.subreddit,
+                    verbose,
+                    prefix="${FG_CYAN}",
+                    output=output,
+                    callback=simulator.harvest,
+                    on_success_update="last_harvest",
+                    config=config,
+                )
+
+            if (
+                now - config.last_retention >= config.retention_delay_seconds
+                and config.retention_delay_seconds > 0
+            ):
+                describe_command(
+                    "prune old comments and submissions",
+                    "Corpus pruned",
+                    simulator.subreddit,
+                    verbose,
+                    prefix="${FG_CYAN}",
+                    output=output,
+                    callback=simulator.prune_corpus,
+                    on_success_update="last_retention",
+                    config=config,
+                )
+
+            if (
+                now - config.last_token_refresh >= config.token_refresh_delay_seconds
+                and config.token_refresh_delay_seconds > 0
+            ):
+                describe_command(
+                    "renew access tokens about to expire",
+                    "Access tokens renewed",
+                    simulator.subreddit,
+                    verbose,
+                    prefix="${FG_WHITE}",
+                    output=output,
+                    callback=simulator.refresh_tokens,
+                    on_success_update="last_token_refresh",
+                    config=config,
+                )
+
+            if (
+                now - config.last_proxy_check >= config.proxy_check_delay_seconds
+                and config.proxy_check_delay_seconds > 0
+                and simulator.proxies is not None
+            ):
+                describe_command(
+                    "health check the proxies",
+                    "Proxies checked",
+                    simulator.subreddit,
+                    verbose,
+                    prefix="${FG_WHITE}",
+                    output=output,
+                    callback=simulator.check_proxies,
+                    on_success_update="last_proxy_check",
+                    config=config,
+                )
+
+            if (
+                now - config.last_model_cache >= config.model_cache_delay_seconds
+                and config.model_cache_delay_seconds > 0
+            ):
+                describe_command(
+                    "save updated models",
+                    "Models saved",
+                    simulator.subreddit,
+                    verbose,
+                    prefix="${FG_CYAN}",
+                    output=output,
+                    callback=simulator.save_models,
+                    on_success_update="last_model_cache",
+                    config=config,
+                )
+
             time.sleep(config.main_loop_delay_seconds)
 
     except KeyboardInterrupt:
@@ -163,7 +260,15 @@ def unexpected_command(ctx, output: IO) -> None:
         "$FG_RED${BOLD}ERROR:$NORMAL Expected at least one of "
         "the options: $BOLD${FG_YELLOW}"
         + "${NORMAL}, $BOLD${FG_YELLOW}".join(
-            ["--run", "--create-db", "--drop_db", "--show_db"]
+            [
+                "--run",
+                "--harvest",
+                "--import-corpus",
+                "--prune-corpus",
+                "--create-db",
+                "--drop_db",
+                "--show_db",
+            ]
         ),
         file=output,
         max_length=-1,
@@ -263,11 +368,23 @@ def load_config_file(config_file: str, verbose: int, output: IO) -> Config:
 
 def update_db_config(file_config: Config) -> Tuple[Config, Engine]:
     engine = Engine.from_config(file_config)
+    upgrade_schema(engine.create(), Base.metadata)
     db = engine.create_session()
     db_config = Config.from_db(db)
     db_config.merge(
         file_config,
-        exclude=["last_comment", "last_submission", "last_vote", "last_update"],
+        exclude=[
+            "last_comment",
+            "last_submission",
+            "last_vote",
+            "last_update",
+            "last_training",
+            "last_harvest",
+            "last_retention",
+            "last_token_refresh",
+            "last_proxy_check",
+            "last_model_cache",
+        ],
     )
     db_config.update_db(db)
     return db_config, engine
@@ -330,6 +447,35 @@ def show_database(engine: Engine, output: IO):
 @click.option("--show-accounts", "-a", is_flag=True, help="Show accounts table.")
 @click.option("--show-config", "-c", is_flag=True, help="Show configuration settings.")
 @click.option("--run", "-r", is_flag=True, help="Run main loop.")
+@click.option(
+    "--warm-models",
+    "-w",
+    is_flag=True,
+    help="Train all models in parallel before running the main loop.",
+)
+@click.option(
+    "--harvest",
+    "-H",
+    is_flag=True,
+    help="Fetch new comments and submissions for all accounts, then exit "
+    "unless --run is given.",
+)
+@click.option(
+    "--import-corpus",
+    "-I",
+    type=click.Path(exists=True, dir_okay=False, resolve_path=True, readable=True),
+    multiple=True,
+    metavar="PATH",
+    help="Import comments and submissions of the configured subreddits from a "
+    "Pushshift-style NDJSON dump (plain, .gz or .zst). Can be repeated.",
+)
+@click.option(
+    "--prune-corpus",
+    "-P",
+    is_flag=True,
+    help="Delete (or archive) comments and submissions outside the retention "
+    "window.",
+)
 @click.option("--create-db", "-C", is_flag=True, help="Create the database schema.")
 @click.option("--drop-db", "-D", is_flag=True, help="Drop the database schema")
 @click.option(
@@ -371,6 +517,10 @@ def show_database(engine: Engine, output: IO):
 def main(
     ctx,
     run,
+    warm_models,
+    harvest,
+    import_corpus,
+    prune_corpus,
     create_db,
     drop_db,
     show_db,
@@ -383,7 +533,9 @@ def main(
 ):
     """Subreddit simulator CLI."""
 
-    if not any([run, create_db, drop_db, show_db]):
+    if not any(
+        [run, harvest, import_corpus, prune_corpus, create_db, drop_db, show_db]
+    ):
         unexpected_command(ctx, output)
 
     if not Path(config_file).exists():
@@ -401,6 +553,24 @@ def main(
 
     db_config, engine = update_db_config(file_config)
 
+    for path in import_corpus:
+        corpus.import_corpus(path, db_config, engine.create_session(), output)
+
+    if prune_corpus:
+        describe_command(
+            "prune old comments and submissions",
+            "Corpus pruned",
+            db_config.subreddit,
+            verbose,
+            prefix="${FG_CYAN}",
+            output=output,
+            callback=lambda: retention.prune_corpus(
+                db_config, engine.create_session(), output
+            ),
+            on_success_update="last_retention",
+            config=db_config,
+        )
+
     if show_db:
         show_database(engine, output)
 
@@ -409,12 +579,40 @@ def main(
         separator(file=output)
         pprint(attr.asdict(db_config), stream=output)
 
-    if run:
+    if run or harvest:
         simulator = Simulator(config=db_config, engine=engine, output=output)
         if show_accounts:
             simulator.print_accounts_table()
 
-        while run_main_loop(db_config, simulator, verbose, output):
+        if harvest:
+            describe_command(
+                "harvest comments and submissions",
+                "Harvested",
+                simulator.subreddit,
+                verbose,
+                prefix="${FG_CYAN}",
+                output=output,
+                callback=simulator.harvest,
+                on_success_update="last_harvest",
+                config=db_config,
+            )
+
+        if run and warm_models:
+            describe_command(
+                "warm up models",
+                "Models trained",
+                simulator.subreddit,
+                verbose,
+                prefix="${FG_CYAN}",
+                output=output,
+                callback=simulator.train_models,
+                on_success_update="last_training",
+                config=db_config,
+            )
+
+        while run and run_main_loop(db_config, simulator, verbose, output):
             pass
 
+        simulator.close()
+
     ctx.exit(0)
@@ -0,0 +1,238 @@
+import json
+import random
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, chain
+
+import markovify
+
+# Token IDs are packed into a single 64-bit integer per chain state, and
+# stored as unsigned ints ("I" arrays, at least 32 bits) otherwise.
+ID_BITS = 21
+MAX_STATE_SIZE = 64 // ID_BITS
+
+BEGIN_ID = 0
+END_ID = 1
+
+
+class Vocabulary:
+    """Interns tokens to integer IDs for a compact chain and overlap index."""
+
+    def __init__(self):
+        self.tokens = [markovify.chain.BEGIN, markovify.chain.END]
+        self.ids = {token: id for id, token in enumerate(self.tokens)}
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def intern(self, token):
+        id = self.ids.get(token)
+        if id is None:
+            id = len(self.tokens)
+            if id >= 1 << ID_BITS:
+                raise ValueError(f"Vocabulary is full ({id} tokens)")
+
+            self.tokens.append(token)
+            self.ids[token] = id
+        return id
+
+    def intern_all(self, tokens):
+        """Intern many tokens at once, and return the mapping to their IDs."""
+        for token in sorted(set(tokens).difference(self.ids)):
+            self.intern(token)
+        return self.ids
+
+    def lookup(self, token):
+        return self.ids.get(token)
+
+
+def pack(ids):
+    key = 0
+    for id in ids:
+        key = (key << ID_BITS) | id
+    return key
+
+
+class CompactChain:
+    """A markovify.Chain drop-in storing transitions in flat arrays.
+
+    States are sorted packed keys of their token IDs, and each state's
+    following token IDs and cumulative weights are stored contiguously
+    (CSR-style) between offsets[i] and offsets[i + 1].
+    """
+
+    def __init__(self, state_size, vocabulary, keys, offsets, follows, cumdist):
+        if state_size > MAX_STATE_SIZE:
+            raise ValueError(f"Unsupported state size {state_size}")
+
+        self.state_size = state_size
+        self.vocabulary = vocabulary
+        self.keys = keys
+        self.offsets = offsets
+        self.follows = follows
+        self.cumdist = cumdist
+
+    @classmethod
+    def from_model(cls, model, state_size, vocabulary):
+        return cls.from_compiled(
+            {
+                state: (follows, list(accumulate(follows.values())))
+                for state, follows in model.items()
+            },
+            state_size,
+            vocabulary,
+        )
+
+    @classmethod
+    def from_compiled(cls, compiled, state_size, vocabulary):
+        """Create a chain from states mapped to their (choices, cumdist)."""
+        vocabulary.intern_all(chain.from_iterable(compiled))
+        ids = vocabulary.intern_all(
+            chain.from_iterable(choices for choices, _ in compiled.values())
+        )
+        intern = ids.__getitem__
+        states = {pack(map(intern, state)): state for state in compiled}
+
+        keys, offsets = array("Q", sorted(states)), array("I", [0])
+        follows, cumdist = array("I"), array("I")
+        for key in keys:
+            choices, state_cumdist = compiled[states[key]]
+            follows.extend(map(intern, choices))
+            cumdist.extend(state_cumdist)
+            offsets.append(len(follows))
+
+        return cls(state_size, vocabulary, keys, offsets, follows, cumdist)
+
+    def index(self, key):
+        i = bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            raise KeyError(key)
+        return i
+
+    def state_key(self, state):
+        ids = [self.vocabulary.lookup(token) for token in state]
+        if None in ids:
+            raise KeyError(state)
+        return pack(ids)
+
+    def _move(self, key):
+        i = self.index(key)
+        start, end = self.offsets[i], self.offsets[i + 1]
+        r = random.random() * self.cumdist[end - 1]
+        return self.follows[bisect_right(self.cumdist, r, start, end)]
+
+    def move(self, state):
+        return self.vocabulary.tokens[self._move(self.state_key(state))]
+
+    def gen(self, init_state=None):
+        tokens = self.vocabulary.tokens
+        mask = (1 << (ID_BITS * self.state_size)) - 1
+        key = self.state_key(init_state) if init_state else BEGIN_ID
+        while True:
+            next_id = self._move(key)
+            if next_id == END_ID:
+                break
+            yield tokens[next_id]
+            key = ((key << ID_BITS) | next_id) & mask
+
+    def walk(self, init_state=None):
+        return list(self.gen(init_state))
+
+    @property
+    def model(self):
+        """The chain expanded back to markovify's dict of dicts."""
+        tokens = self.vocabulary.tokens
+        mask = (1 << ID_BITS) - 1
+        model = {}
+        for i, key in enumerate(self.keys):
+            state = tuple(
+                tokens[(key >> (ID_BITS * shift)) & mask]
+                for shift in reversed(range(self.state_size))
+            )
+            follows, previous = {}, 0
+            for j in range(self.offsets[i], self.offsets[i + 1]):
+                follows[tokens[self.follows[j]]] = self.cumdist[j] - previous
+                previous = self.cumdist[j]
+            model[state] = follows
+        return model
+
+    def to_json(self):
+        return json.dumps(list(self.model.items()))
+
+
+class CompactOverlapIndex:
+    """An OverlapIndex drop-in storing the corpus as flat token ID arrays.
+
+    Sentences are concatenated, separated by END_ID, and every position of
+    a word bigram is kept sorted by the bigram's packed key, so n-grams are
+    verified only at the positions of their rarest bigram.
+    """
+
+    def __init__(self, vocabulary, tokens, unigrams, bigrams, positions):
+        self.vocabulary = vocabulary
+        self.tokens = tokens
+        self.unigrams = unigrams
+        self.bigrams = bigrams
+        self.positions = positions
+
+    @classmethod
+    def from_runs(cls, runs, vocabulary):
+        intern = vocabulary.intern_all(chain.from_iterable(runs)).__getitem__
+        tokens = array("I")
+        for run in runs:
+            tokens.extend(map(intern, run))
+            tokens.append(END_ID)
+
+        # Bigram keys (up to 2 * ID_BITS bits) and positions are sorted
+        # together as single integers, much faster than sorting tuples.
+        pairs = sorted(
+            (((first << 32) | second) << 32) | position
+            for position, (first, second) in enumerate(zip(tokens, tokens[1:]))
+            if first != END_ID and second != END_ID
+        )
+        mask = (1 << 32) - 1
+        unigrams = array("I", sorted(set(tokens) - {END_ID}))
+        bigrams = array("Q", (pair >> 32 for pair in pairs))
+        positions = array("I", (pair & mask for pair in pairs))
+        return cls(vocabulary, tokens, unigrams, bigrams, positions)
+
+    def contains(self, gram):
+        ids = [self.vocabulary.lookup(token) for token in gram]
+        if None in ids:
+            return False
+
+        if len(ids) < 2:
+            return all(
+                bisect_left(self.unigrams, id) < bisect_right(self.unigrams, id)
+                for id in ids
+            )
+
+        ranges = []
+        for offset, (first, second) in enumerate(zip(ids, ids[1:])):
+            key = (first << 32) | second
+            ranges.append(
+                (
+                    bisect_left(self.bigrams, key),
+                    bisect_right(self.bigrams, key),
+                    offset,
+                )
+            )
+        start, end, offset = min(ranges, key=lambda r: r[1] - r[0])
+
+        gram, size = array("I", ids), len(ids)
+        for position in self.positions[start:end]:
+            position -= offset
+            if position >= 0 and self.tokens[position : position + size] == gram:
+                return True
+
+        return False
+
+    def runs(self):
+        tokens = self.vocabulary.tokens
+        run = []
+        for id in self.tokens:
+            if id == END_ID:
+                yield run
+                run = []
+            else:
+                run.append(tokens[id])
@@ -2,7 +2,6 @@ import random
 import re
 from configparser import SafeConfigParser
 from logging import getLogger
-from operator import attrgetter
 from pathlib import Path
 from typing import Any, Callable, Dict, List, Optional, Tuple
 
@@ -105,7 +104,53 @@ class Config:
 
     # Optional settings.
     max_corpus_size: int = attr.ib(default=1000, converter=int)
+    training_token_budget: int = attr.ib(default=0, converter=int)
+    training_strata: int = attr.ib(default=1, converter=int)
+    training_by_score: bool = attr.ib(default=False, converter=parse_bool)
+    training_query_batch_size: int = attr.ib(default=1000, converter=int)
     ignored_users: List[str] = attr.ib(factory=list, converter=parse_users_csv)
+    cache_trained_models: bool = attr.ib(default=True, converter=parse_bool)
+    incremental_training: bool = attr.ib(default=True, converter=parse_bool)
+    compact_models: bool = attr.ib(default=False, converter=parse_bool)
+    model_store_dir: str = attr.ib(default="")
+
+    # Text generation budgets (0 means unlimited).
+    sentence_max_attempts: int = attr.ib(default=10000, converter=int)
+    sentence_max_seconds: float = attr.ib(default=5.0, converter=optional_float)
+    action_max_attempts: int = attr.ib(default=100000, converter=int)
+    action_max_seconds: float = attr.ib(default=30.0, converter=optional_float)
+
+    # Background sentence pools (0 disables them).
+    sentence_pool_size: int = attr.ib(default=0, converter=int)
+    sentence_pool_refill_seconds: float = attr.ib(default=5.0, converter=optional_float)
+
+    # IDs of the stored comments / submissions kept in memory.
+    seen_ids_window_days: int = attr.ib(default=30, converter=int)
+    seen_ids_bloom_capacity: int = attr.ib(default=0, converter=int)
+
+    # Pruning old comments / submissions (0 keeps all of them).
+    retention_rows: int = attr.ib(default=0, converter=int)
+    retention_days: int = attr.ib(default=0, converter=int)
+    retention_batch_size: int = attr.ib(default=1000, converter=int)
+    retention_archive_dir: str = attr.ib(default="")
+    retention_vacuum: bool = attr.ib(default=True, converter=parse_bool)
+
+    # Fetching comments / submissions.
+    listing_cache_seconds: float = attr.ib(default=60.0, converter=optional_float)
+    account_refresh_seconds: float = attr.ib(default=300.0, converter=optional_float)
+    catch_up_limit: int = attr.ib(default=1000, converter=int)
+    import_batch_size: int = attr.ib(default=1000, converter=int)
+    import_processes: int = attr.ib(default=0, converter=int)
+    harvest_threads: int = attr.ib(default=4, converter=int)
+    login_mode: str = attr.ib(default="sequential", converter=str_lower)
+    login_threads: int = attr.ib(default=8, converter=int)
+    token_refresh_margin_seconds: int = attr.ib(default=300, converter=int)
+    http_pool_connections: int = attr.ib(default=10, converter=int)
+    http_pool_maxsize: int = attr.ib(default=10, converter=int)
+    http_keep_alive_seconds: int = attr.ib(default=60, converter=int)
+
+    # Worker processes used to train models (0 means one per CPU).
+    training_processes: int = attr.ib(default=0, converter=int)
 
     # Main loop configuration.
     comment_delay_seconds: int = attr.ib(default=600, converter=int)
@@ -113,6 +158,12 @@ class Config:
     leaderboard_update_delay_seconds: int = attr.ib(default=1800, converter=int)
     main_loop_delay_seconds: int = attr.ib(default=60, converter=int)
     voting_delay_seconds: int = attr.ib(default=60, converter=int)
+    training_delay_seconds: int = attr.ib(default=0, converter=int)
+    harvest_delay_seconds: int = attr.ib(default=0, converter=int)
+    retention_delay_seconds: int = attr.ib(default=0, converter=int)
+    token_refresh_delay_seconds: int = attr.ib(default=60, converter=int)
+    proxy_check_delay_seconds: int = attr.ib(default=600, converter=int)
+    model_cache_delay_seconds: int = attr.ib(default=1800, converter=int)
 
     # Picking account to post a comment.
     min_seconds_since_last_comment: int = attr.ib(default=600, converter=int)
@@ -126,6 +177,12 @@ class Config:
     last_submission: float = attr.ib(default=0.0, converter=optional_float)
     last_update: float = attr.ib(default=0.0, converter=optional_float)
     last_vote: float = attr.ib(default=0.0, converter=optional_float)
+    last_training: float = attr.ib(default=0.0, converter=optional_float)
+    last_harvest: float = attr.ib(default=0.0, converter=optional_float)
+    last_retention: float = attr.ib(default=0.0, converter=optional_float)
+    last_token_refresh: float = attr.ib(default=0.0, converter=optional_float)
+    last_proxy_check: float = attr.ib(default=0.0, converter=optional_float)
+    last_model_cache: float = attr.ib(default=0.0, converter=optional_float)
 
     # Accounts configuration.
     usernames_csv: List[str] = attr.ib(factory=list, converter=parse_users_csv)
@@ -143,6 +200,10 @@ class Config:
     proxy_users_csv: List[str] = attr.ib(factory=list, converter=parse_str_csv)
     proxy_paswd_csv: List[str] = attr.ib(factory=list, converter=parse_str_csv)
     random_proxy_per_account: bool = attr.ib(default=False, converter=parse_bool)
+    proxy_check_url: str = attr.ib(default="https://www.reddit.com/robots.txt")
+    proxy_check_timeout_seconds: float = attr.ib(default=10.0, converter=optional_float)
+    proxy_max_error_rate: float = attr.ib(default=0.5, converter=optional_float)
+    proxy_max_latency_seconds: float = attr.ib(default=5.0, converter=optional_float)
 
     # NOTE: The following config settings should not be changed,
     # unless using a custom Reddit instance, rather than reddit.com.
@@ -186,9 +247,9 @@ class Config:
         parser = SafeConfigParser()
         parser.read(path, encoding="utf-8")
 
-        config: Dict[str, Any] = dict.fromkeys(
-            map(attrgetter("name"), attr.fields(cls)), ""
-        )
+        # Keys missing from the file keep their defaults, so that config files
+        # written before a setting was added still load.
+        config: Dict[str, Any] = {}
 
         sections = ("database", "settings", "accounts", "top_subreddits", "proxies")
         for section in sections:
@@ -198,7 +259,7 @@ class Config:
             for key, value in parser.items(section):
                 config[key] = value
 
-        config.pop("verbose")
+        config.pop("verbose", None)
         return cls(**config)
 
     @classmethod
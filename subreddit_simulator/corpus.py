@@ -0,0 +1,142 @@
+import gzip
+import io
+import json
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from logging import getLogger
+from pathlib import Path
+
+from .database import insert_ignore
+from .models import Comment, Submission, normalize_html_texts
+from .utils import echo
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = getLogger(__name__)
+
+# Pushshift dumps are compressed with a long window.
+ZSTD_MAX_WINDOW_SIZE = 2**31
+
+
+def open_dump(path):
+    """Open a plain, gzip or zstd compressed NDJSON dump for reading text."""
+    path = Path(path)
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8")
+
+    if path.suffix in (".zst", ".zstd"):
+        if zstandard is None:
+            raise ValueError(
+                f"Cannot read {path.name}: install zstandard to import zstd dumps"
+            )
+        decompressor = zstandard.ZstdDecompressor(max_window_size=ZSTD_MAX_WINDOW_SIZE)
+        return io.TextIOWrapper(
+            decompressor.stream_reader(path.open("rb")), encoding="utf-8"
+        )
+
+    return path.open("r", encoding="utf-8")
+
+
+def read_dump(path, subreddits, config, executor=None):
+    """Yield comments and submissions from a dump, in the given subreddits.
+
+    Records with a title are submissions, the others comments. Records that
+    can't be parsed are skipped. The bodies of each import_batch_size
+    records are normalized at once, in the worker processes of `executor`
+    if set.
+    """
+    records = []
+    with open_dump(path) as dump:
+        for line_number, line in enumerate(dump, 1):
+            if not line.strip():
+                continue
+
+            try:
+                data = json.loads(line)
+                if str(data.get("subreddit", "")).lower() in subreddits:
+                    records.append((line_number, data))
+            except (KeyError, TypeError, ValueError) as err:
+                logger.debug("Skipping %s:%d: %r", path, line_number, err)
+
+            if len(records) >= config.import_batch_size:
+                yield from parse_records(path, records, config, executor)
+                records = []
+
+    yield from parse_records(path, records, config, executor)
+
+
+def record_html(data):
+    """Return the HTML (or text) body of a dump record, None if it has none."""
+    if "title" not in data:
+        return data.get("body_html") or data.get("body") or ""
+    if data.get("is_self"):
+        return data.get("selftext_html") or data.get("selftext")
+    return None
+
+
+def parse_records(path, records, config, executor=None):
+    """Yield the rows of (line number, data) dump records."""
+    bodies = normalize_html_texts([record_html(data) for _, data in records], executor)
+    for (line_number, data), body in zip(records, bodies):
+        try:
+            if "title" in data:
+                yield Submission.from_dump(data, config=config, body=body)
+            else:
+                yield Comment.from_dump(data, config=config, body=body)
+        except (KeyError, TypeError, ValueError) as err:
+            logger.debug("Skipping %s:%d: %r", path, line_number, err)
+
+
+def import_corpus(path, config, db, output=None):
+    """Bulk load the comments and submissions of a dump into the database.
+
+    Only rows of the configured subreddits are imported, in batches of
+    import_batch_size, and rows already stored are skipped. HTML bodies are
+    normalized in import_processes worker processes, if set. Return the
+    numbers of comments and submissions actually inserted.
+    """
+    subreddits = set(config.subreddits_csv)
+    batches = {Comment: [], Submission: []}
+    counts = {Comment: 0, Submission: 0}
+    num_read = 0
+
+    def flush(model):
+        counts[model] += insert_ignore(db, model, batches[model])
+        db.commit()
+        batches[model] = []
+        logger.info(
+            "Loaded %d new comment(s), %d new submission(s) of %d read from %s",
+            counts[Comment],
+            counts[Submission],
+            num_read,
+            path,
+        )
+
+    processes = config.import_processes
+    with ProcessPoolExecutor(processes) if processes else nullcontext() as executor:
+        for row in read_dump(path, subreddits, config, executor):
+            num_read += 1
+            batch = batches[type(row)]
+            batch.append(row)
+            if len(batch) >= config.import_batch_size:
+                flush(type(row))
+
+    for model, batch in batches.items():
+        if batch:
+            flush(model)
+
+    echo(
+        "$FG_GREEN${DIM}Loaded $BOLD${num_comments}$NORMAL$DIM new comment(s) and "
+        "$BOLD${num_submissions}$NORMAL$DIM new submission(s) of "
+        "$BOLD${num_read}$NORMAL$DIM read from $BOLD${path}",
+        file=output,
+        num_comments=counts[Comment],
+        num_submissions=counts[Submission],
+        num_read=num_read,
+        path=str(path),
+        max_length=-1,
+    )
+    return counts[Comment], counts[Submission]
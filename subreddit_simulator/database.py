@@ -2,7 +2,8 @@ import json
 from logging import getLogger
 
 import attr
-from sqlalchemy import Text, TypeDecorator, create_engine
+from sqlalchemy import Text, TypeDecorator, create_engine, inspect
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import sessionmaker
 
 logger = getLogger(__name__)
@@ -12,10 +13,69 @@ class JSONSerialized(TypeDecorator):
     impl = Text
 
     def process_bind_param(self, value, dialect):
-        return json.dumps(value)
+        return None if value is None else json.dumps(value)
 
     def process_result_value(self, value, dialect):
-        return json.loads(value)
+        return None if value is None else json.loads(value)
+
+
+def insert_ignore(session, model, objects):
+    """Insert mapped `objects` of `model` with a single executemany.
+
+    Rows whose primary key already exists are skipped by the database, with
+    ON CONFLICT DO NOTHING on PostgreSQL and INSERT OR IGNORE on SQLite.
+    Return the number of rows actually inserted, as counted by the driver.
+    """
+    if not objects:
+        return 0
+
+    table = model.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        statement = postgresql.insert(table).on_conflict_do_nothing()
+    elif dialect == "sqlite":
+        statement = table.insert().prefix_with("OR IGNORE")
+    elif dialect == "mysql":
+        statement = table.insert().prefix_with("IGNORE")
+    else:
+        statement = table.insert()
+
+    columns = [(column.name, column.key) for column in table.columns]
+    result = session.execute(
+        statement,
+        [{name: getattr(obj, key) for name, key in columns} for obj in objects],
+    )
+    return result.rowcount
+
+
+def upgrade_schema(engine, metadata):
+    """Add the tables, columns and indexes missing from an existing database.
+
+    Existing rows are kept, with NULL in the added columns. This is safe to
+    run on every start, as only what's missing is added.
+    """
+    metadata.create_all(engine, checkfirst=True)
+
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer
+    for table in metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in columns:
+                continue
+
+            logger.info("Adding column %s.%s", table.name, column.name)
+            column_type = column.type.compile(dialect=engine.dialect)
+            engine.execute(
+                f"ALTER TABLE {quote.format_table(table)} "
+                f"ADD COLUMN {quote.format_column(column)} {column_type}"
+            )
+
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                logger.info("Adding index %s", index.name)
+                index.create(engine)
 
 
 @attr.s(auto_attribs=True)
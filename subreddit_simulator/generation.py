@@ -0,0 +1,97 @@
+import time
+from collections import Counter
+from logging import getLogger
+from typing import Optional
+
+import attr
+
+logger = getLogger(__name__)
+
+
+@attr.s
+class GenerationStats:
+    """Counters of the text generation work done for an account."""
+
+    attempts: int = attr.ib(default=0)
+    sentences: int = attr.ib(default=0)
+    failures: int = attr.ib(default=0)
+    exhausted: int = attr.ib(default=0)
+    seconds: float = attr.ib(default=0.0)
+    rejections: Counter = attr.ib(factory=Counter)
+
+    def reject(self, reason: str) -> None:
+        self.rejections[reason] += 1
+
+    def summary(self) -> str:
+        rejections = ", ".join(
+            f"{reason}={count}" for reason, count in self.rejections.most_common()
+        )
+        return (
+            f"{self.sentences} sentence(s), {self.failures} failure(s), "
+            f"{self.attempts} attempt(s) in {self.seconds:.2f}s, "
+            f"{self.exhausted} exhausted budget(s), rejections: {rejections or 'none'}"
+        )
+
+
+@attr.s
+class GenerationBudget:
+    """Limits the attempts and wall time spent generating text.
+
+    A budget for a single sentence is created from the budget of the whole
+    comment / submission with sentence(), and is exhausted as soon as either
+    of them is. Zero limits mean unlimited.
+    """
+
+    max_attempts: int = attr.ib(default=0)
+    max_seconds: float = attr.ib(default=0.0)
+    stats: GenerationStats = attr.ib(factory=GenerationStats)
+    parent: Optional["GenerationBudget"] = attr.ib(default=None, repr=False)
+    attempts: int = attr.ib(default=0, init=False)
+    started: float = attr.ib(init=False)
+
+    @started.default
+    def _started(self) -> float:
+        return time.monotonic()
+
+    def sentence(self, max_attempts: int = 0, max_seconds: float = 0.0):
+        return GenerationBudget(
+            max_attempts=max_attempts,
+            max_seconds=max_seconds,
+            stats=self.stats,
+            parent=self,
+        )
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def exhausted(self) -> bool:
+        if self.max_attempts and self.attempts >= self.max_attempts:
+            return True
+
+        if self.max_seconds and self.elapsed >= self.max_seconds:
+            return True
+
+        return self.parent is not None and self.parent.exhausted
+
+    def attempt(self) -> bool:
+        """Count an attempt if the budget allows it."""
+        if self.exhausted:
+            self.stats.exhausted += 1
+            return False
+
+        self.attempts += 1
+        if self.parent is not None:
+            self.parent.attempts += 1
+        self.stats.attempts += 1
+        return True
+
+    def done(self, sentence: Optional[str]) -> Optional[str]:
+        """Record the outcome of generating a sentence within this budget."""
+        if sentence:
+            self.stats.sentences += 1
+        else:
+            self.stats.failures += 1
+        self.stats.seconds += self.elapsed
+        return sentence
@@ -0,0 +1,71 @@
+import threading
+import time
+from logging import getLogger
+
+from praw.models.reddit.base import RedditBase
+
+logger = getLogger(__name__)
+
+
+class ListingCache:
+    """Subreddit listings shared by all actions and accounts for a while.
+
+    Listings are cached by subreddit, listing type, arguments and limit for
+    listing_cache_seconds (0 disables caching). The cached items are copies
+    bound to the Reddit session of the account asking for them, so actions
+    on them (e.g. replying) are made by that account.
+    """
+
+    def __init__(self, config=None):
+        self.ttl = config.listing_cache_seconds
+        self.lock = threading.Lock()
+        self.listings = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session, subreddit, listing, *args, limit=100):
+        """Return the items of e.g. `session.subreddit(subreddit).new()`."""
+        key = (subreddit, listing, args, limit)
+        now = time.monotonic()
+
+        with self.lock:
+            fetched, items = self.listings.get(key, (None, None))
+            if fetched is not None and now - fetched < self.ttl:
+                self.hits += 1
+                logger.debug("Listing cache hit for %r (%s)", key, self.summary())
+                return [self.bind(item, session) for item in items]
+
+            self.misses += 1
+
+        logger.debug("Listing cache miss for %r (%s)", key, self.summary())
+        items = list(getattr(session.subreddit(subreddit), listing)(*args, limit=limit))
+
+        if self.ttl > 0:
+            with self.lock:
+                self.listings = {
+                    key: entry
+                    for key, entry in self.listings.items()
+                    if now - entry[0] < self.ttl
+                }
+                self.listings[key] = (now, items)
+
+        return items
+
+    @staticmethod
+    def bind(item, session):
+        if item._reddit is session:
+            return item
+
+        # Recreate the item from its listing data, rather than copying it,
+        # so nothing it lazily fetched with another session is shared. Its
+        # author and subreddit are passed by name, as in the listing JSON,
+        # since rebuilding them from the objects would fetch them.
+        data = {
+            name: str(value) if isinstance(value, RedditBase) else value
+            for name, value in vars(item).items()
+            if not name.startswith("_")
+        }
+        return type(item)(session, _data=data)
+
+    def summary(self):
+        return f"{self.hits} hit(s), {self.misses} miss(es)"
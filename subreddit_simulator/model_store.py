@@ -0,0 +1,203 @@
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from pathlib import Path
+
+from .compact import CompactChain, CompactOverlapIndex, Vocabulary
+
+# File layout (native byte order, every section aligned to 8 bytes):
+#   header: magic, byte order mark, state size, then the section lengths;
+#   vocabulary: token byte offsets, UTF-8 token bytes, token IDs sorted by
+#       their bytes (for lookups);
+#   chain: state keys, offsets, following token IDs, cumulative weights;
+#   overlap index: corpus token IDs, unigrams, bigram keys, bigram positions.
+MAGIC = b"SRSMODEL"
+BYTE_ORDER_MARK = 0x01020304
+HEADER = struct.Struct("=8sII11Q")
+SECTIONS = (
+    ("token_offsets", "I"),
+    ("token_bytes", "B"),
+    ("token_order", "I"),
+    ("keys", "Q"),
+    ("offsets", "I"),
+    ("follows", "I"),
+    ("cumdist", "I"),
+    ("tokens", "I"),
+    ("unigrams", "I"),
+    ("bigrams", "Q"),
+    ("positions", "I"),
+)
+
+
+def _padding(size):
+    return -size % 8
+
+
+class MappedTokens:
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, id):
+        return bytes(self.data[self.offsets[id] : self.offsets[id + 1]]).decode("utf-8")
+
+
+class MappedVocabulary:
+    """A read-only Vocabulary over the token sections of a model file."""
+
+    def __init__(self, offsets, data, order):
+        self.tokens = MappedTokens(offsets, data)
+        self.order = order
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def lookup(self, token):
+        encoded = token.encode("utf-8")
+        offsets, data, order = self.tokens.offsets, self.tokens.data, self.order
+
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            id = order[mid]
+            if bytes(data[offsets[id] : offsets[id + 1]]) < encoded:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo < len(order):
+            id = order[lo]
+            if bytes(data[offsets[id] : offsets[id + 1]]) == encoded:
+                return id
+        return None
+
+
+def model_bytes(model):
+    """Return a trained SubredditSimulatorText in the model file layout.
+
+    Compact (and mapped) models are written as they are, other models are
+    compacted first.
+    """
+    chain, index = model.chain, model.overlap_index
+    if not isinstance(chain, CompactChain) or not isinstance(
+        index, CompactOverlapIndex
+    ):
+        vocabulary = Vocabulary()
+        chain = CompactChain.from_compiled(chain.compiled, model.state_size, vocabulary)
+        index = CompactOverlapIndex.from_runs(model.parsed_sentences, vocabulary)
+
+    vocabulary = chain.vocabulary
+    encoded = [vocabulary.tokens[id].encode("utf-8") for id in range(len(vocabulary))]
+    token_offsets = array("I", [0])
+    for token in encoded:
+        token_offsets.append(token_offsets[-1] + len(token))
+    token_order = array("I", sorted(range(len(encoded)), key=encoded.__getitem__))
+
+    sections = dict(
+        token_offsets=token_offsets,
+        token_bytes=array("B", b"".join(encoded)),
+        token_order=token_order,
+        keys=chain.keys,
+        offsets=chain.offsets,
+        follows=chain.follows,
+        cumdist=chain.cumdist,
+        tokens=index.tokens,
+        unigrams=index.unigrams,
+        bigrams=index.bigrams,
+        positions=index.positions,
+    )
+    lengths = [len(sections[name]) for name, _ in SECTIONS]
+
+    parts = [HEADER.pack(MAGIC, BYTE_ORDER_MARK, model.state_size, *lengths)]
+    parts.append(b"\0" * _padding(HEADER.size))
+    for name, _ in SECTIONS:
+        data = sections[name].tobytes()
+        parts.append(data)
+        parts.append(b"\0" * _padding(len(data)))
+    return b"".join(parts)
+
+
+def write_model_file(path, data):
+    """Write a model serialized with model_bytes() to `path`, atomically.
+
+    The file is written under a unique temporary name and mapped before
+    being renamed to `path`, and the mapping is returned like with
+    open_model_file(), so it stays valid even if another process replaces
+    or removes `path` right away.
+    """
+    path = Path(path)
+    fd, temp_path = tempfile.mkstemp(
+        prefix=f".{path.name}.", suffix=".tmp", dir=path.parent
+    )
+    try:
+        with open(fd, "wb") as f:
+            f.write(data)
+
+        mapped = open_model_file(temp_path)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+    return mapped
+
+
+def open_model_file(path):
+    """Map a model file, returning its state size, chain and overlap index.
+
+    The returned arrays are views of the mapped file, so its pages are only
+    read on demand and are shared by every process mapping the same file.
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        return load_model(mapped)
+    except ValueError as err:
+        raise ValueError(f"{err}: {path}") from err
+
+
+def load_model(data):
+    """Load a model from a buffer in the model file layout, without copying.
+
+    Return its state size, chain and overlap index, as open_model_file().
+    """
+    magic, mark, state_size, *lengths = HEADER.unpack_from(data)
+    if magic != MAGIC or mark != BYTE_ORDER_MARK:
+        raise ValueError("Not a model file (or wrong byte order)")
+
+    view = memoryview(data)
+    position = HEADER.size + _padding(HEADER.size)
+    sections = {}
+    for (name, typecode), length in zip(SECTIONS, lengths):
+        size = length * array(typecode).itemsize
+        sections[name] = view[position : position + size].cast(typecode)
+        position += size + _padding(size)
+
+    vocabulary = MappedVocabulary(
+        sections["token_offsets"], sections["token_bytes"], sections["token_order"]
+    )
+    chain = CompactChain(
+        state_size,
+        vocabulary,
+        sections["keys"],
+        sections["offsets"],
+        sections["follows"],
+        sections["cumdist"],
+    )
+    index = CompactOverlapIndex(
+        vocabulary,
+        sections["tokens"],
+        sections["unigrams"],
+        sections["bigrams"],
+        sections["positions"],
+    )
+    return state_size, chain, index
@@ -1,18 +1,43 @@
+import bisect
+import hashlib
 import html
+import html.parser
 import random
-import sys
+import threading
+import time
 from datetime import datetime
+from collections import Counter
+from itertools import accumulate
 from logging import getLogger
+from operator import attrgetter, sub
+from pathlib import Path
+from types import SimpleNamespace
 
 import markovify
 import praw
 import prawcore
 import pytz
 import requests
-from sqlalchemy import Boolean, Column, DateTime, Index, Integer, String, Text
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    func,
+)
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import deferred
 
-from .database import JSONSerialized
+from .compact import CompactChain, CompactOverlapIndex, Vocabulary
+from .database import JSONSerialized, insert_ignore
+from .generation import GenerationBudget, GenerationStats
+from .model_store import load_model, model_bytes, open_model_file, write_model_file
+from .transport import Transport
 from .utils import echo
 
 MAX_OVERLAP_RATIO = 0.7
@@ -24,19 +49,388 @@ Base = declarative_base()
 logger = getLogger(__name__)
 
 
+class SubredditSimulatorChain(markovify.Chain):
+    """A markovify.Chain sampling from precomputed cumulative weights.
+
+    Each state's choices and cumulative weights are compiled once after
+    training, so every step of a walk is a dict lookup and a bisect. Only
+    the compiled states are kept: `model` expands them back to markovify's
+    dict of dicts when needed (e.g. to serialize the chain), and
+    add_counts() recompiles only the states an update touches.
+    """
+
+    def __init__(self, corpus, state_size, model=None):
+        self.state_size = state_size
+        if model is not None:
+            self.model = model
+        else:
+            # The counts are compiled in place, without a second dict.
+            self.compiled = self.build(corpus, state_size)
+            for state, follows in self.compiled.items():
+                self.compiled[state] = (
+                    tuple(follows),
+                    list(accumulate(follows.values())),
+                )
+        self.precompute_begin_state()
+
+    @property
+    def model(self):
+        return {state: self.follows(state) for state in self.compiled}
+
+    @model.setter
+    def model(self, model):
+        self.compiled = {}
+        for state, follows in model.items():
+            self.compile(state, follows)
+
+    def build(self, corpus, state_size):
+        model = {}
+        begin, end = [markovify.chain.BEGIN] * state_size, [markovify.chain.END]
+        for run in corpus:
+            items = begin + run + end
+            for i in range(len(run) + 1):
+                state = tuple(items[i : i + state_size])
+                follows = model.get(state)
+                if follows is None:
+                    follows = model[state] = {}
+                follow = items[i + state_size]
+                follows[follow] = follows.get(follow, 0) + 1
+        return model
+
+    def compile(self, state, follows):
+        if follows:
+            self.compiled[state] = (tuple(follows), list(accumulate(follows.values())))
+        else:
+            self.compiled.pop(state, None)
+
+    def follows(self, state):
+        """Return the counts of the items following `state`."""
+        choices, cumdist = self.compiled[state]
+        return dict(zip(choices, map(sub, cumdist, [0] + cumdist)))
+
+    def add_counts(self, counts):
+        """Add the `counts` of following items (negative to remove) by state."""
+        for state, deltas in counts.items():
+            follows = self.follows(state) if state in self.compiled else {}
+            for follow, delta in deltas.items():
+                follows[follow] = follows.get(follow, 0) + delta
+                if follows[follow] <= 0:
+                    del follows[follow]
+            self.compile(state, follows)
+
+    def precompute_begin_state(self):
+        # The begin state is compiled like the others, but an empty chain is
+        # still rejected with a KeyError, like markovify does.
+        self.compiled[(markovify.chain.BEGIN,) * self.state_size]
+
+    def move(self, state):
+        choices, cumdist = self.compiled[state]
+        return choices[bisect.bisect(cumdist, random.random() * cumdist[-1])]
+
+    def gen(self, init_state=None):
+        compiled, rand, bisect_right = self.compiled, random.random, bisect.bisect
+        state = init_state or (markovify.chain.BEGIN,) * self.state_size
+        while True:
+            choices, cumdist = compiled[state]
+            next_word = choices[bisect_right(cumdist, rand() * cumdist[-1])]
+            if next_word == markovify.chain.END:
+                break
+            yield next_word
+            state = state[1:] + (next_word,)
+
+
+class OverlapIndex:
+    """An index of training sentences for checking generated ones overlap.
+
+    Every sentence is indexed by its word bigrams, so finding whether an
+    n-gram occurs in the corpus only scans the sentences sharing its rarest
+    bigram, instead of searching the whole rejoined corpus text.
+    """
+
+    def __init__(self, runs=()):
+        unigrams = Counter()
+        self.bigrams = {}
+        for run in map(tuple, runs):
+            unigrams.update(run)
+            for bigram in set(zip(run, run[1:])):
+                bigram_runs = self.bigrams.get(bigram)
+                if bigram_runs is None:
+                    self.bigrams[bigram] = {run: 1}
+                else:
+                    bigram_runs[run] = bigram_runs.get(run, 0) + 1
+        self.unigrams = dict(unigrams)
+
+    def _count(self, run, delta):
+        run = tuple(run)
+        for word in run:
+            self.unigrams[word] = self.unigrams.get(word, 0) + delta
+            if self.unigrams[word] <= 0:
+                del self.unigrams[word]
+
+        for bigram in set(zip(run, run[1:])):
+            runs = self.bigrams.setdefault(bigram, {})
+            runs[run] = runs.get(run, 0) + delta
+            if runs[run] <= 0:
+                del runs[run]
+                if not runs:
+                    del self.bigrams[bigram]
+
+    def add(self, run):
+        self._count(run, 1)
+
+    def remove(self, run):
+        self._count(run, -1)
+
+    def contains(self, gram):
+        gram = tuple(gram)
+        if len(gram) < 2:
+            return all(word in self.unigrams for word in gram)
+
+        runs = min(
+            (self.bigrams.get(bigram, {}) for bigram in zip(gram, gram[1:])), key=len
+        )
+        size = len(gram)
+        for run in runs:
+            for i in range(len(run) - size + 1):
+                if run[i] == gram[0] and run[i : i + size] == gram:
+                    return True
+
+        return False
+
+
 class SubredditSimulatorText(markovify.Text):
-    def __init__(self, input_text, state_size=2, **kwargs):
-        input_text = html.unescape(input_text)
+    def __init__(self, input_text, state_size=2, chain=None, parsed_sentences=None):
+        """Create a model of a text, of its parsed sentences, or from a chain.
+
+        Unlike markovify, the corpus isn't rejoined into a single string, as
+        generated sentences are checked for overlap with an index of the
+        parsed sentences, and the chain is built from them directly.
+        """
+        if parsed_sentences is None and input_text is not None:
+            parsed_sentences = list(self.generate_corpus(html.unescape(input_text)))
+
+        self.state_size = state_size
+        self.retain_original = parsed_sentences is not None
+        self.parsed_sentences = parsed_sentences
         try:
-            super().__init__(input_text, state_size=state_size, **kwargs)
+            self.chain = chain or SubredditSimulatorChain(parsed_sentences, state_size)
         except KeyError as err:
-            if markovify.text.BEGIN in str(err):
-                raise ValueError(f"Ignoring bad input_text: {input_text!r}") from err
+            raise ValueError("Ignoring empty training corpus") from err
+
+        self.overlap_index = OverlapIndex(parsed_sentences or ())
+
+        # Parsed sentences ("runs") of each training row, by row ID, when the
+        # model was created with from_texts(); needed by update().
+        self.runs = None
+
+        # Guards the chain while it's updated, as sentences may be generated
+        # from it in a SentencePool worker thread at the same time.
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_texts(cls, texts, state_size=2):
+        """Train a model on a mapping of row IDs to their texts.
+
+        Texts may also be given as the list of sentences split from them with
+        split(), as stored along with comments and submissions.
+        """
+        runs = {id: cls.parse(text) for id, text in texts.items()}
+        return cls.from_runs(runs, state_size=state_size)
+
+    @classmethod
+    def from_runs(cls, runs, state_size=2):
+        """Train a model on a mapping of row IDs to their parsed sentences."""
+        parsed_sentences = [run for row_runs in runs.values() for run in row_runs]
+        if not parsed_sentences:
+            raise ValueError("Ignoring empty training corpus")
+
+        model = cls(None, state_size=state_size, parsed_sentences=parsed_sentences)
+        model.runs = runs
+        return model
+
+    @classmethod
+    def from_file(cls, path):
+        """Load a model written with model_store.write_model_file().
+
+        The file is memory-mapped, so loading it is cheap: its pages are
+        only read when sentences are generated.
+        """
+        return cls.from_mapped(*open_model_file(path))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Load a model serialized with model_store.model_bytes().
+
+        The model's arrays are views of `data`, so nothing is recomputed.
+        """
+        return cls.from_mapped(*load_model(data))
+
+    @classmethod
+    def from_mapped(cls, state_size, chain, overlap_index):
+        """Create a model from a model file mapped with open_model_file()."""
+        model = cls(None, state_size=state_size, chain=chain)
+        model.overlap_index = overlap_index
+        return model
+
+    @classmethod
+    def split(cls, text):
+        """Split a text into the sentences a model is trained on."""
+        return [
+            sentence
+            for sentence in cls.sentence_split(cls, html.unescape(text))
+            if cls.test_sentence_input(cls, sentence)
+        ]
+
+    @classmethod
+    def count_tokens(cls, sentences):
+        return sum(len(cls.word_split(cls, sentence)) for sentence in sentences or ())
+
+    @classmethod
+    def parse(cls, text):
+        """Parse a text, or the sentences split from it, into word runs."""
+        sentences = cls.split(text) if isinstance(text, str) else text
+        return [cls.word_split(cls, sentence) for sentence in sentences]
+
+    def update(self, added=None, removed=()):
+        """Incrementally add and remove training rows.
+
+        Transition counts of the `added` mapping of row IDs to texts are
+        added to the chain, and those of the `removed` row IDs subtracted,
+        so the cost scales with the size of the change, not of the corpus.
+        """
+        if self.runs is None:
+            raise ValueError("Cannot update a model without its training rows")
+
+        with self.lock:
+            self._update(added or {}, removed)
+
+    def compact(self):
+        """Switch to the compact, read-only chain and overlap index.
+
+        Tokens are interned in a vocabulary of the model's own, freed along
+        with it, and the parsed sentences are no longer kept, so the model
+        can't be updated incrementally afterwards.
+        """
+        with self.lock:
+            vocabulary = Vocabulary()
+            self.chain = CompactChain.from_compiled(
+                self.chain.compiled, self.state_size, vocabulary
+            )
+            self.overlap_index = CompactOverlapIndex.from_runs(
+                self.parsed_sentences, vocabulary
+            )
+            self.parsed_sentences = None
+            self.runs = None
+
+    def _update(self, added, removed):
+        state_size = self.state_size
+        counts = {}
+
+        def count(run, delta):
+            items = [markovify.chain.BEGIN] * state_size + run + [markovify.chain.END]
+            for i in range(len(run) + 1):
+                follows = counts.setdefault(tuple(items[i : i + state_size]), {})
+                follow = items[i + state_size]
+                follows[follow] = follows.get(follow, 0) + delta
+
+        for id in removed:
+            for run in self.runs.pop(id, ()):
+                count(run, -1)
+                self.overlap_index.remove(run)
+
+        for id, text in added.items():
+            if id in self.runs:
+                continue
+            self.runs[id] = self.parse(text)
+            for run in self.runs[id]:
+                count(run, 1)
+                self.overlap_index.add(run)
 
-    def test_sentence_output(self, *args, **kwargs):
-        r = super().test_sentence_output(*args, **kwargs)
+        self.parsed_sentences = [run for runs in self.runs.values() for run in runs]
+        self.chain.add_counts(counts)
+        try:
+            self.chain.precompute_begin_state()
+        except KeyError as err:
+            raise ValueError("Ignoring empty training corpus") from err
+
+    def overlaps(self, words, max_overlap_ratio, max_overlap_total):
+        # Sentences sharing with the corpus any sequence of words longer than
+        # the allowed overlap are rejected, like markovify does.
+        overlap_max = min(max_overlap_total, int(round(max_overlap_ratio * len(words))))
+        gram_size = overlap_max + 1
+        return any(
+            self.overlap_index.contains(words[i : i + gram_size])
+            for i in range(max(len(words) - overlap_max, 1))
+        )
+
+    @staticmethod
+    def randomly_accept(r):
         return r if random.random() > 0.5 else random.choice((True, False))
 
+    def test_sentence_output(self, words, max_overlap_ratio, max_overlap_total):
+        return self.randomly_accept(
+            not self.overlaps(words, max_overlap_ratio, max_overlap_total)
+        )
+
+    def make_sentence(self, init_state=None, budget=None, **kwargs):
+        """Generate a sentence like markovify does, within a `budget`.
+
+        Without a GenerationBudget, up to `tries` attempts are made. Besides
+        markovify's keyword arguments, `max_chars` and `min_chars` limit the
+        length of the sentence. Rejected attempts are counted by reason in
+        the budget's stats.
+        """
+        if budget is None:
+            budget = GenerationBudget(
+                max_attempts=kwargs.get("tries", markovify.text.DEFAULT_TRIES)
+            )
+        max_overlap_ratio = kwargs.get(
+            "max_overlap_ratio", markovify.text.DEFAULT_MAX_OVERLAP_RATIO
+        )
+        max_overlap_total = kwargs.get(
+            "max_overlap_total", markovify.text.DEFAULT_MAX_OVERLAP_TOTAL
+        )
+        test_output = kwargs.get("test_output", True)
+        max_words = kwargs.get("max_words")
+        max_chars = kwargs.get("max_chars")
+        min_chars = kwargs.get("min_chars", 0)
+
+        prefix = list(init_state or ())
+        while prefix and prefix[0] == markovify.chain.BEGIN:
+            prefix = prefix[1:]
+
+        stats = budget.stats
+        while budget.attempt():
+            with self.lock:
+                words = prefix + self.chain.walk(init_state)
+                if max_words is not None and len(words) > max_words:
+                    stats.reject("too_many_words")
+                    continue
+
+                sentence = self.word_join(words)
+                if max_chars is not None and len(sentence) > max_chars:
+                    stats.reject("too_long")
+                    continue
+
+                if len(sentence) < min_chars:
+                    stats.reject("too_short")
+                    continue
+
+                if test_output:
+                    overlaps = self.overlaps(
+                        words, max_overlap_ratio, max_overlap_total
+                    )
+                    if not self.randomly_accept(not overlaps):
+                        stats.reject("overlap" if overlaps else "random")
+                        continue
+
+            return budget.done(sentence)
+
+        return budget.done(None)
+
+    def make_short_sentence(self, max_chars, min_chars=0, **kwargs):
+        return self.make_sentence(max_chars=max_chars, min_chars=min_chars, **kwargs)
+
     @staticmethod
     def prepare_sentance(sentence):
         if not sentence or not sentence.strip():
@@ -60,6 +454,49 @@ class SubredditSimulatorText(markovify.Text):
         return markovify.split_into_sentences(text)
 
 
+def corpus_fingerprint(state_size, ids):
+    """Return a digest identifying a training corpus by its row IDs."""
+    digest = hashlib.sha1(f"{state_size}:".encode("utf-8"))
+    for id in sorted(ids):
+        digest.update(id.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+def training_text(text, sentences):
+    # Rows stored before sentences were split at ingestion are split when
+    # training.
+    return text if sentences is None else sentences
+
+
+def training_filters(model, config):
+    """Return the SQL filters selecting the rows of `model` to train on.
+
+    Comments without a body, NSFW submissions and the rows of ignored users
+    are left out.
+    """
+    if model is Comment:
+        filters = [Comment.body != ""]
+    else:
+        filters = [Submission.over_18.isnot(True)]
+    if config.ignored_users:
+        filters.append(~model.author.in_(config.ignored_users))
+    return filters
+
+
+def training_tokens(model):
+    """Return the SQL token count of the rows of `model`.
+
+    Rows stored without one are assumed to have a token per 6 characters.
+    """
+    if model is Comment:
+        length = func.length(Comment.body)
+    else:
+        length = func.length(Submission.title) + func.coalesce(
+            func.length(Submission.body), 0
+        )
+    return func.coalesce(model.num_tokens, length / 6 + 1)
+
+
 class Setting(Base):  # type: ignore
     __tablename__ = "settings"
 
@@ -67,6 +504,80 @@ class Setting(Base):  # type: ignore
     value = Column(JSONSerialized)
 
 
+def train_model(state_size, texts):
+    """Train a model, e.g. in a worker process.
+
+    Return it serialized with model_store.model_bytes(), so it's loaded
+    without being rebuilt, along with its runs for the model cache.
+    """
+    model = SubredditSimulatorText.from_texts(texts, state_size=state_size)
+    return model_bytes(model), model.runs
+
+
+class TrainedModel(Base):  # type: ignore
+    __tablename__ = "trained_models"
+
+    subreddit = Column(String(21), primary_key=True)
+    kind = Column(String(10), primary_key=True)
+    state_size = Column(Integer)
+    fingerprint = Column(String(40))
+    trained = Column(DateTime(timezone=True))
+    stats = Column(JSONSerialized)
+    # The model in the model file layout, see model_store.model_bytes().
+    data = Column(LargeBinary)
+    # The parsed sentences of each training row, by row ID, to update the
+    # model incrementally; only loaded when they're needed.
+    runs = deferred(Column(JSONSerialized))
+
+
+class Cursor(Base):  # type: ignore
+    """The newest comment / submission fetched from a subreddit."""
+
+    __tablename__ = "cursors"
+
+    subreddit = Column(String(21), primary_key=True)
+    kind = Column(String(10), primary_key=True)
+    fullname = Column(String(20))
+    date = Column(DateTime)
+
+
+class SessionToken:
+    """The access token of a praw session, kept by its prawcore authorizer.
+
+    prawcore keeps the token and its expiry in private attributes (hence
+    the version pinned in setup.py). If they aren't found, the token is
+    neither read nor set, so access tokens are just not cached.
+    """
+
+    ATTRIBUTES = ("access_token", "_expiration_timestamp", "refresh")
+
+    def __init__(self, session):
+        authorizer = getattr(getattr(session, "_core", None), "_authorizer", None)
+        if not all(hasattr(authorizer, name) for name in self.ATTRIBUTES):
+            logger.debug("Cannot cache the access tokens of %r", authorizer)
+            authorizer = None
+        self.authorizer = authorizer
+
+    def get(self):
+        """Return the access token and its expiry (a Unix timestamp)."""
+        if self.authorizer is None or self.authorizer.access_token is None:
+            return None, None
+        return self.authorizer.access_token, self.authorizer._expiration_timestamp
+
+    def set(self, access_token, expires):
+        if self.authorizer is None:
+            return False
+
+        self.authorizer.access_token = access_token
+        self.authorizer._expiration_timestamp = expires
+        self.authorizer.scopes = {"*"}
+        return True
+
+    def renew(self):
+        if self.authorizer is not None:
+            self.authorizer.refresh()
+
+
 class Account(Base):  # type: ignore
     __tablename__ = "accounts"
 
@@ -85,6 +596,9 @@ class Account(Base):  # type: ignore
     num_votes = Column(Integer, default=0)
     last_voted = Column(DateTime(timezone=True))
     proxy_url = Column(String(255), default="")
+    access_token = Column(Text)
+    # Unix timestamp, like prawcore's.
+    token_expires = Column(Float)
 
     def __init__(
         self,
@@ -114,84 +628,179 @@ class Account(Base):  # type: ignore
 
     @property
     def session(self):
+        """The account's Reddit session, logging in on first use.
+
+        Using it also refreshes the account, at most every
+        account_refresh_seconds.
+        """
         if not hasattr(self, "_session"):
+            self.use_session(self.login())
+        else:
+            self.refresh()
+        return self._session
+
+    def use_session(self, session, me=None):
+        """Use a session created with login(), e.g. in another thread.
+
+        `me` is the account's Redditor if already fetched with the session.
+        """
+        self._session = session
+        self.refresh(force=True, me=me)
+
+    def login(self):
+        echo(
+            "$FG_WHITE${DIM}Logging in as $FG_CYAN$BOLD${name}$NORMAL$FG_WHITE "
+            "with $FG_LIGHTBLACK${password}$FG_WHITE$DIM...",
+            name=self.name,
+            password=self.password,
+            file=self.output,
+            max_length=-1,
+        )
+
+        verify = True
+        if self.config.allow_self_signed_ssl_certs:
+            echo("$FG_YELLOW${DIM}Allowing self-signed SSL certs", file=self.output)
+            requests.packages.urllib3.disable_warnings()
+            verify = False
+
+        proxies = getattr(self, "proxies", None)
+        proxy_url = ""
+        if self.config.random_proxy_per_account:
+            if proxies is not None:
+                self.proxy_url = proxies.assign(self.name, self.proxy_url)
+            elif not self.proxy_url:
+                self.proxy_url = self.config.random_proxy["https"]
+
+            proxy_url = self.proxy_url
             echo(
-                "$FG_WHITE${DIM}Logging in as $FG_CYAN$BOLD${name}$NORMAL$FG_WHITE "
-                "with $FG_LIGHTBLACK${password}$FG_WHITE$DIM...",
-                name=self.name,
-                password=self.password,
-                file=self.output,
+                "$FG_CYAN${DIM}Using proxy $BOLD${url}$NORMAL for account $BOLD${name}",
                 max_length=-1,
+                file=self.output,
+                url=self.proxy_url,
+                name=self.name,
             )
 
-            requestor_kwargs = {}
-            if self.config.allow_self_signed_ssl_certs:
-                echo("$FG_YELLOW${DIM}Allowing self-signed SSL certs", file=self.output)
-                requests.packages.urllib3.disable_warnings()
-                unverified_session = requests.Session()
-                unverified_session.verify = False
-                requestor_kwargs = {"session": unverified_session}
-
-            if self.config.random_proxy_per_account:
-                session = requestor_kwargs.get("session", requests.Session())
-                if not self.proxy_url:
-                    self.proxy_url = self.config.random_proxy["https"]
-
-                session.proxies = {
-                    "https": self.proxy_url,
-                    "http": self.proxy_url.replace("https:", "http:"),
-                }
+        transport = getattr(self, "transport", None)
+        if transport is None:
+            transport = self.transport = Transport(self.config)
+        http_session = transport.session(proxy_url, verify)
+        if proxies is not None:
+            proxies.observe(http_session)
+
+        session = praw.Reddit(
+            client_id=self.config.client_id,
+            client_secret=self.config.client_secret,
+            user_agent=self.config.user_agent,
+            username=self.name,
+            password=self.password,
+            reddit_url=self.config.reddit_url,
+            oauth_url=self.config.oauth_url,
+            short_url=self.config.short_url,
+            comment_kind=self.config.comment_kind,
+            message_kind=self.config.message_kind,
+            redditor_kind=self.config.redditor_kind,
+            submission_kind=self.config.submission_kind,
+            subreddit_kind=self.config.subreddit_kind,
+            requestor_kwargs={"session": http_session},
+        )
+        self.restore_token(session)
+        self._http_session = http_session
+        return session
+
+    def use_proxy(self, proxy_url):
+        """Switch the account, and its session if logged in, to another proxy."""
+        self.proxy_url = proxy_url
+        http_session = getattr(self, "_http_session", None)
+        if http_session is not None:
+            self.transport.session(proxy_url, http_session.verify, http_session)
+
+    def restore_token(self, session):
+        """Authorize `session` with the stored access token, until it expires.
+
+        This skips the password grant when logging in again, e.g. after a
+        restart. If Reddit rejects the token, prawcore gets a new one.
+        """
+        if not self.access_token or (self.token_expires or 0) <= time.time():
+            return False
+
+        if not SessionToken(session).set(self.access_token, self.token_expires):
+            return False
+
+        logger.debug("Reusing the access token of %r", self.name)
+        return True
+
+    def store_token(self):
+        """Copy the session's access token to the account, if it changed."""
+        access_token, expires = SessionToken(self._session).get()
+        if access_token is None or access_token == self.access_token:
+            return False
+
+        self.access_token = access_token
+        self.token_expires = expires
+        return True
+
+    def token_expiring(self, margin):
+        """Whether the session's access token expires in `margin` seconds."""
+        if not hasattr(self, "_session"):
+            return False
+
+        access_token, expires = SessionToken(self._session).get()
+        if access_token is None:
+            return False
+        return expires - time.time() < margin
+
+    def renew_token(self):
+        """Get a new access token for the session, e.g. in another thread."""
+        SessionToken(self._session).renew()
+
+    def refresh(self, force=False, me=None):
+        """Update the account's karma from Reddit and show its API limits.
+
+        Unless `force` is set, this is skipped if the account was refreshed
+        less than account_refresh_seconds ago. The account is only saved if
+        its karma changed. Returns whether the account was refreshed.
+        """
+        now = time.monotonic()
+        refreshed = getattr(self, "_refreshed", None)
+        if (
+            not force
+            and refreshed is not None
+            and now - refreshed < self.config.account_refresh_seconds
+        ):
+            return False
+
+        if me is None:
+            try:
+                me = self._session.user.me(use_cache=False)
+            except prawcore.exceptions.OAuthException as err:
                 echo(
-                    "$FG_CYAN${DIM}Using proxy $BOLD${url}$NORMAL for account $BOLD${name}",
-                    max_length=-1,
+                    "$BG_RED$FG_YELLOW${BOLD}OAUTH ERROR:${NORMAL} ${err}",
+                    err=str(err),
                     file=self.output,
-                    url=self.proxy_url,
-                    name=self.name,
+                    max_length=-1,
                 )
-
-                requestor_kwargs = {"session": session}
-
-            if not requestor_kwargs:
-                requestor_kwargs = None
-
-            self._session = praw.Reddit(
-                client_id=self.config.client_id,
-                client_secret=self.config.client_secret,
-                user_agent=self.config.user_agent,
-                username=self.name,
-                password=self.password,
-                reddit_url=self.config.reddit_url,
-                oauth_url=self.config.oauth_url,
-                short_url=self.config.short_url,
-                comment_kind=self.config.comment_kind,
-                message_kind=self.config.message_kind,
-                redditor_kind=self.config.redditor_kind,
-                submission_kind=self.config.submission_kind,
-                subreddit_kind=self.config.subreddit_kind,
-                requestor_kwargs=requestor_kwargs,
-            )
-
-        try:
-            me = self._session.user.me(use_cache=False)
-            self.link_karma = int(me.link_karma)
-            self.comment_karma = int(me.comment_karma)
-            if self.num_comments < self.comment_karma:
-                self.num_comments = self.comment_karma
-                self.last_commented = datetime.now(pytz.utc)
-            if self.num_submissions < self.link_karma:
-                self.num_submissions = self.link_karma
-                self.last_submitted = datetime.now(pytz.utc)
+                del self._session
+                raise
+
+        self._refreshed = now
+        link_karma, comment_karma = int(me.link_karma), int(me.comment_karma)
+        changed = (link_karma, comment_karma) != (self.link_karma, self.comment_karma)
+        self.link_karma = link_karma
+        self.comment_karma = comment_karma
+        if self.num_comments < self.comment_karma:
+            self.num_comments = self.comment_karma
+            self.last_commented = datetime.now(pytz.utc)
+            changed = True
+        if self.num_submissions < self.link_karma:
+            self.num_submissions = self.link_karma
+            self.last_submitted = datetime.now(pytz.utc)
+            changed = True
+        if self.store_token():
+            changed = True
+        if changed:
             self.db.add(self)
             self.db.flush()
             self.db.commit()
-        except prawcore.exceptions.OAuthException as err:
-            echo(
-                "$BG_RED$FG_YELLOW${BOLD}OAUTH ERROR:${NORMAL} ${err}",
-                err=str(err),
-                file=self.output,
-                max_length=-1,
-            )
-            sys.exit(2)
 
         limits = self._session.auth.limits
         reset = (
@@ -211,7 +820,7 @@ class Account(Base):  # type: ignore
             reset_after=reset,
             max_length=-1,
         )
-        return self._session
+        return True
 
     @property
     def can_vote(self):
@@ -245,85 +854,158 @@ class Account(Base):  # type: ignore
             file=self.output,
         )
 
-        subreddit = self.session.subreddit(self.subreddit)
-
-        seen_ids = set(
-            c.id for c in self.db.query(Comment).filter_by(subreddit=self.subreddit)
-        )
-
-        comments = []
-
-        for comment in subreddit.comments(limit=limit):
-            comment = Comment(comment, config=self.config)
-
-            if comment.id not in seen_ids:
-                seen_ids.add(comment.id)
-                comments.append(comment)
-
-            if (
-                store_in_db
-                and not self.db.query(Comment).filter_by(id=comment.id).first()
-            ):
-                self.db.add(comment)
-                self.db.flush()
-
+        cursor = self.get_cursor("comment")
+        comments = self.fetch_comments(self.session, cursor, limit=limit)
+        new_comments = self.store_new(Comment, comments, store_in_db)
         if store_in_db:
-            self.db.commit()
-
-        return comments
+            self.update_cursor("comment", comments)
+        return new_comments
 
     def get_submissions_from_site(self, limit=100, store_in_db=True, top_of="day"):
+        cursor = self.get_cursor("submission")
+        if cursor:
+            listing = "new"
+        else:
+            listing = "top daily" if top_of == "day" else f"top {top_of}"
         echo(
-            "$FG_WHITE${DIM}Getting up to ${limit} top "
-            "$BOLD${top}$NORMAL$DIM submissions "
-            "from $BOLD${subreddit}...",
+            "$FG_WHITE${DIM}Getting up to ${limit} $BOLD${listing}$NORMAL$DIM "
+            "submissions from $BOLD${subreddit}...",
             max_length=-1,
-            limit=limit,
-            top="daily" if top_of == "day" else top_of,
+            limit=max(limit, self.config.catch_up_limit) if cursor else limit,
+            listing=listing,
             subreddit=self.subreddit,
             file=self.output,
         )
 
-        subreddit = self.session.subreddit(self.subreddit)
-
-        # get the newest submission we've previously seen as a stopping point
-        last_submission = (
-            self.db.query(Submission)
-            .filter_by(subreddit=self.subreddit)
-            .order_by(Submission.date.desc())
+        submissions = self.fetch_submissions(
+            self.session, cursor, limit=limit, top_of=top_of
+        )
+        new_submissions = self.store_new(Submission, submissions, store_in_db)
+        if store_in_db:
+            self.update_cursor("submission", submissions)
+        return new_submissions
+
+    def fullname(self, kind, id):
+        if kind == "comment":
+            return f"{self.config.comment_kind}_{id}"
+        return f"{self.config.submission_kind}_{id}"
+
+    def get_cursor(self, kind):
+        """Return the (fullname, date) of the newest `kind` fetched, if any."""
+        cursor = (
+            self.db.query(Cursor.fullname, Cursor.date)
+            .filter_by(subreddit=self.subreddit, kind=kind)
             .first()
         )
+        if cursor is None and kind == "submission":
+            # get the newest submission we've previously seen as a stopping point
+            last_submission = (
+                self.db.query(Submission.id, Submission.date)
+                .filter_by(subreddit=self.subreddit)
+                .order_by(Submission.date.desc())
+                .first()
+            )
+            if last_submission:
+                cursor = (self.fullname(kind, last_submission.id), last_submission.date)
+
+        return tuple(cursor) if cursor else None
+
+    def update_cursor(self, kind, rows):
+        """Move the cursor of `kind` to the newest of the fetched `rows`."""
+        if not rows:
+            return
+
+        newest = max(rows, key=attrgetter("date"))
+        cursor = self.get_cursor(kind)
+        if cursor and cursor[1] > newest.date:
+            return
+
+        self.db.merge(
+            Cursor(
+                subreddit=self.subreddit,
+                kind=kind,
+                fullname=self.fullname(kind, newest.id),
+                date=newest.date,
+            )
+        )
+        self.db.commit()
+
+    # The fetch_*() methods only use the Reddit `session`, not the database,
+    # so they can run in worker threads while rows are stored by the caller.
+    # They stop at the `cursor` returned by get_cursor(), if any.
+
+    def fetch_comments(self, session, cursor=None, limit=100):
+        subreddit = session.subreddit(self.subreddit)
+        if cursor:
+            # Page through everything posted since the cursor.
+            limit = max(limit, self.config.catch_up_limit)
+
+        comments = {}
+        for comment in subreddit.comments(limit=limit):
+            if cursor and (
+                comment.fullname == cursor[0]
+                or datetime.utcfromtimestamp(comment.created_utc) < cursor[1]
+            ):
+                break
+
+            if comment.id not in comments:
+                comments[comment.id] = Comment(comment, config=self.config)
+
+        return list(comments.values())
+
+    def fetch_submissions(self, session, cursor=None, limit=100, top_of="day"):
+        subreddit = session.subreddit(self.subreddit)
+        if cursor:
+            # Page through everything submitted since the cursor, newest
+            # first: the top listings are sorted by score, not date.
+            listing = subreddit.new(limit=max(limit, self.config.catch_up_limit))
+        else:
+            listing = subreddit.top(top_of, limit=limit)
 
         seen_ids = set()
         submissions = []
 
-        for submission in subreddit.top(top_of, limit=limit):
-            submission = Submission(submission, config=self.config)
-            if last_submission:
-                if (
-                    submission.id == last_submission.id
-                    or submission.date <= last_submission.date
-                ):
-                    break
+        for submission in listing:
+            if cursor and (
+                submission.fullname == cursor[0]
+                or datetime.utcfromtimestamp(submission.created_utc) <= cursor[1]
+            ):
+                break
 
             # somehow there are occasionally duplicates - skip over them
             if submission.id in seen_ids:
                 continue
             seen_ids.add(submission.id)
 
-            submissions.append(submission)
-            if store_in_db:
-                self.db.add(submission)
+            submissions.append(Submission(submission, config=self.config))
 
-        if store_in_db:
-            self.db.commit()
         return submissions
 
-    def should_include_comment(self, comment):
-        if comment.author in self.config.ignored_users:
-            return False
+    def store_new(self, model, rows, store_in_db=True):
+        """Return the `rows` not in the database yet, bulk inserting them.
 
-        return True
+        Existing rows are found in the simulator's SeenIdIndex if set, or
+        with a single query for the whole page.
+        """
+        seen_ids = getattr(self, "seen_ids", None)
+        if seen_ids is not None:
+            new_rows = seen_ids.new_rows(self.db, model, self.subreddit, rows)
+        else:
+            ids = [row.id for row in rows]
+            existing = set()
+            if ids:
+                existing = {
+                    id for id, in self.db.query(model.id).filter(model.id.in_(ids))
+                }
+            new_rows = [row for row in rows if row.id not in existing]
+
+        if store_in_db and new_rows:
+            insert_ignore(self.db, model, new_rows)
+            self.db.commit()
+            if seen_ids is not None:
+                seen_ids.add(model, self.subreddit, [row.id for row in new_rows])
+
+        return new_rows
 
     def get_comments_for_training(self, limit=None):
         echo(
@@ -335,19 +1017,18 @@ class Account(Base):  # type: ignore
             file=self.output,
         )
 
-        comments = (
-            self.db.query(Comment)
-            .filter_by(subreddit=self.subreddit)
-            .filter(Comment.body != "")
-            .order_by(Comment.date.desc())
-            .limit(self.config.max_corpus_size)
-        )
-        valid_comments = [
-            comment for comment in comments if self.should_include_comment(comment)
-        ]
-        random.shuffle(valid_comments)
-        logger.info("valid comments for training: %d", len(valid_comments))
-        return valid_comments
+        columns = (Comment.id, Comment.body, Comment.sentences)
+        filters = training_filters(Comment, self.config)
+        if self.config.training_token_budget:
+            comments = self.sample_for_training(Comment, columns, *filters)
+        else:
+            comments = (
+                self.db.query(*columns)
+                .filter(Comment.subreddit == self.subreddit, *filters)
+                .order_by(Comment.date.desc())
+                .limit(self.config.max_corpus_size)
+            )
+        return self.iter_training_rows(comments, "comments")
 
     def get_submissions_for_training(self, limit=None):
         echo(
@@ -359,134 +1040,472 @@ class Account(Base):  # type: ignore
             file=self.output,
         )
 
-        submissions = list(
-            self.db.query(Submission)
-            .filter_by(subreddit=self.subreddit)
-            .order_by(Submission.date.desc())
-            .limit(self.config.max_corpus_size)
+        columns = (
+            Submission.id,
+            Submission.title,
+            Submission.title_sentences,
+            Submission.url,
+            Submission.body,
+            Submission.sentences,
+            Submission.over_18,
+        )
+        filters = training_filters(Submission, self.config)
+        if self.config.training_token_budget:
+            submissions = self.sample_for_training(Submission, columns, *filters)
+        else:
+            submissions = (
+                self.db.query(*columns)
+                .filter(Submission.subreddit == self.subreddit, *filters)
+                .order_by(Submission.date.desc())
+                .limit(self.config.max_corpus_size)
+            )
+        return self.iter_training_rows(submissions, "submissions")
+
+    def iter_training_rows(self, query, name):
+        """Yield the rows of a training query, in batches from the database."""
+        num_rows = 0
+        for num_rows, row in enumerate(
+            query.yield_per(self.config.training_query_batch_size), 1
+        ):
+            yield row
+        logger.info("valid %s for training: %d", name, num_rows)
+
+    def sample_for_training(self, model, columns, *filters):
+        """Select the `columns` of rows with up to training_token_budget tokens.
+
+        Rows are split into training_strata periods of time with the same
+        number of rows, each with an equal share of the budget, and picked
+        from the newest or, with training_by_score, the highest scoring rows
+        of each period, using window functions.
+        """
+        strata = max(self.config.training_strata, 1)
+        num_tokens = training_tokens(model)
+        ranked = (
+            self.db.query(
+                model.id,
+                model.date,
+                model.score,
+                num_tokens.label("num_tokens"),
+                func.ntile(strata).over(order_by=model.date.desc()).label("stratum"),
+            )
+            .filter(model.subreddit == self.subreddit, *filters)
+            .subquery()
         )
-        logger.debug("%d total submissions for training", len(submissions))
-        valid_submissions = [
-            submission
-            for submission in submissions
-            if not submission.over_18
-            and submission.author not in self.config.ignored_users
-        ]
-        random.shuffle(valid_submissions)
-        logger.info("valid submissions for training: %d", len(valid_submissions))
-        return valid_submissions
 
-    def train_from_comments(self, get_new_comments=True):
-        echo(
-            "$FG_WHITE${DIM}Getting ${new}comments for training ",
-            max_length=-1,
-            new="new " if get_new_comments else " ",
-            file=self.output,
+        order_by = [ranked.c.date.desc(), ranked.c.id]
+        if self.config.training_by_score:
+            order_by.insert(0, ranked.c.score.desc())
+        running = self.db.query(
+            ranked.c.id,
+            func.sum(ranked.c.num_tokens)
+            .over(partition_by=ranked.c.stratum, order_by=order_by, rows=(None, 0))
+            .label("running_tokens"),
+        ).subquery()
+
+        budget = self.config.training_token_budget // strata
+        return self.db.query(*columns).filter(
+            model.id.in_(
+                self.db.query(running.c.id).filter(running.c.running_tokens <= budget)
+            )
         )
 
-        if get_new_comments:
-            self.get_comments_from_site()
+    def get_model(self, kind, state_size, texts, train=True, trained=None, **stats):
+        """Return a model of `kind` trained on `texts`, reusing a cached one.
+
+        Models are cached in memory, in the `trained_models` table and in the
+        `model_store_dir` files, keyed by subreddit, kind, state size and a
+        fingerprint of the row IDs in the `texts` mapping. Models are loaded
+        from `trained_models` in the compact representation, without being
+        trained again. With `incremental_training`, a cached model for a
+        different set of rows is updated with only the rows that were added
+        or removed since; compact and stored models are read-only, so they
+        are updated from the training rows kept in `trained_models`. Any
+        `stats` are stored along with the model and restored as account
+        attributes when it is reused.
+
+        Trained and updated models are only written to `trained_models` by
+        save_models(), as writing a whole model after every incremental
+        update would cost more than the update; until then, the training
+        rows of compact and stored models are kept in memory.
+
+        When the model has to be trained from scratch, a `trained` model
+        returned by train_model() is used if given, otherwise None is returned
+        unless `train` is set.
+        """
+        fingerprint = corpus_fingerprint(state_size, texts)
+        if not hasattr(self, "_models"):
+            self._models = {}
+        if not hasattr(self, "_unsaved_models"):
+            self._unsaved_models = {}
+
+        models = self._models
+        cached_fingerprint, model = models.get(kind, (None, None))
+        if cached_fingerprint == fingerprint:
+            logger.debug("Reusing in-memory %s model for %r", kind, self.subreddit)
+            return model
+
+        path = self.model_path(kind, state_size, fingerprint)
+        if path is not None and path.exists():
+            logger.debug("Mapping stored %s model for %r", kind, self.subreddit)
+            model = SubredditSimulatorText.from_file(path)
+        else:
+            model, runs = self._get_model(
+                kind, state_size, texts, fingerprint, model, stats, train, trained
+            )
+            if model is None:
+                return None
+
+            if path is not None:
+                model = self.store_model(kind, path, model)
+            elif self.config.compact_models and model.parsed_sentences is not None:
+                model.compact()
+
+            if self.config.cache_trained_models and runs is not None:
+                self._unsaved_models[kind] = (
+                    state_size,
+                    fingerprint,
+                    stats,
+                    model,
+                    runs,
+                )
+
+        models[kind] = (fingerprint, model)
+
+        pool = getattr(self, "sentence_pool", None)
+        if pool is not None:
+            options = self.sentence_options(kind)
+            pool.register(
+                self.subreddit,
+                kind,
+                fingerprint,
+                lambda budget: model.make_sentence(budget=budget, **options),
+            )
+
+        return model
 
-        comments = []
-        for comment in self.get_comments_for_training():
-            comments.append(comment.body)
+    def model_path(self, kind, state_size, fingerprint):
+        if not self.config.model_store_dir:
+            return None
 
-        self.avg_comment_len = sum(len(c) for c in comments) / float(
-            len(comments) or 0.001
+        return Path(self.config.model_store_dir).joinpath(
+            f"{self.subreddit}-{kind}-{state_size}-{fingerprint}.model"
         )
-        self.avg_comment_len = min(250, self.avg_comment_len)
 
-        if self.avg_comment_len >= 140:
+    def store_model(self, kind, path, model):
+        """Write a model to the model store and return it memory-mapped.
+
+        Files of the previous models of the same kind are removed; processes
+        still mapping them keep their pages until they load the new one.
+        Files written since this one was started, e.g. by another process
+        training on a newer corpus, are left for that process to clean up.
+        """
+        started = time.time()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = model_bytes(model)
+        model = SubredditSimulatorText.from_mapped(*write_model_file(path, data))
+
+        for stale in path.parent.glob(f"{self.subreddit}-{kind}-*.model"):
+            try:
+                if stale != path and stale.stat().st_mtime < started:
+                    stale.unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as err:
+                logger.warning("Cannot remove stale model file: %s", err)
+
+        return model
+
+    def _get_model(
+        self, kind, state_size, texts, fingerprint, model, stats, train, trained
+    ):
+        # Return the model and, unless it was loaded from the cache, its runs.
+        if model is not None and (model.state_size != state_size or model.runs is None):
+            model = None
+
+        unsaved = self._unsaved_models.get(kind)
+        if (
+            model is None
+            and unsaved is not None
+            and unsaved[0] == state_size
+            and self.config.incremental_training
+        ):
+            # The unsaved training rows of a compact or stored model; copied
+            # so they're left as they are if the update fails.
+            model = SubredditSimulatorText.from_runs(
+                dict(unsaved[4]), state_size=state_size
+            )
+
+        if model is None and self.config.cache_trained_models:
+            cached = (
+                self.db.query(TrainedModel)
+                .filter_by(subreddit=self.subreddit, kind=kind, state_size=state_size)
+                .first()
+            )
+            if cached and cached.data is not None:
+                if cached.fingerprint == fingerprint:
+                    logger.debug("Loading cached %s model for %r", kind, self.subreddit)
+                    for name, value in (cached.stats or {}).items():
+                        setattr(self, name, value)
+                    return SubredditSimulatorText.from_bytes(cached.data), None
+
+                if self.config.incremental_training and cached.runs:
+                    logger.debug(
+                        "Loading training rows of the cached %s model for %r",
+                        kind,
+                        self.subreddit,
+                    )
+                    model = SubredditSimulatorText.from_runs(
+                        cached.runs, state_size=state_size
+                    )
+
+        if (
+            model is not None
+            and model.runs is not None
+            and self.config.incremental_training
+        ):
+            added = {id: text for id, text in texts.items() if id not in model.runs}
+            removed = [id for id in model.runs if id not in texts]
+            logger.debug(
+                "Updating %s model for %r: %d rows added, %d removed",
+                kind,
+                self.subreddit,
+                len(added),
+                len(removed),
+            )
+            model.update(added, removed)
+        elif trained is not None:
+            data, runs = trained
+            return SubredditSimulatorText.from_bytes(data), runs
+        elif train:
+            logger.debug("Training %s model for %r", kind, self.subreddit)
+            model = SubredditSimulatorText.from_texts(texts, state_size=state_size)
+        else:
+            return None, None
+
+        return model, model.runs
+
+    def save_models(self):
+        """Cache the models trained or updated since they were last saved.
+
+        Return the number of models saved.
+        """
+        unsaved = getattr(self, "_unsaved_models", {})
+        num_saved = 0
+        while unsaved:
+            kind, (state_size, fingerprint, stats, model, runs) = unsaved.popitem()
+            logger.debug("Saving %s model for %r", kind, self.subreddit)
+            self.save_model(kind, state_size, fingerprint, stats, model, runs)
+            num_saved += 1
+        return num_saved
+
+    def save_model(self, kind, state_size, fingerprint, stats, model, runs):
+        """Cache a model in `trained_models`, along with its training `runs`."""
+        with model.lock:
+            data = model_bytes(model)
+
+        self.db.merge(
+            TrainedModel(
+                subreddit=self.subreddit,
+                kind=kind,
+                state_size=state_size,
+                fingerprint=fingerprint,
+                trained=datetime.now(pytz.utc),
+                stats=stats,
+                data=data,
+                runs=runs,
+            )
+        )
+        self.db.commit()
+
+    def comment_training_jobs(self, comments):
+        """Return (kind, state_size, texts, stats) to train comment models.
+
+        The `comments` are iterated only once, so they may be streamed.
+        """
+        texts = {}
+        comment_len = 0
+        for comment in comments:
+            texts[comment.id] = training_text(comment.body, comment.sentences)
+            comment_len += len(comment.body)
+
+        avg_comment_len = comment_len / float(len(texts) or 0.001)
+        avg_comment_len = min(250, avg_comment_len)
+
+        if avg_comment_len >= 140:
             state_size = 3
         else:
             state_size = 2
 
-        try:
-            self.comment_model = SubredditSimulatorText(
-                " ".join(comments).strip(), state_size=state_size
+        return [("comment", state_size, texts, dict(avg_comment_len=avg_comment_len))]
+
+    def submission_training_jobs(self, submissions):
+        """Return (kind, state_size, texts, stats) to train submission models.
+
+        A job without a state size means no model should be trained. The
+        `submissions` are iterated only once, so they may be streamed, and
+        those with a URL are kept in link_submissions.
+        """
+        titles = {}
+        selftexts = {}
+        selftext_len = 0
+        self.link_submissions = []
+
+        for submission in submissions:
+            titles[submission.id] = training_text(
+                submission.title, submission.title_sentences
             )
-        except (ValueError, IndexError) as err:
-            logger.error("Cannot construct comment model: %s", err, exc_info=True)
-            self.comment_model = None
-            return False
+            if submission.url:
+                self.link_submissions.append(submission)
+            elif submission.body is not None:
+                # Link submissions imported without a URL have no body either.
+                selftexts[submission.id] = training_text(
+                    submission.body, submission.sentences
+                )
+                selftext_len += len(submission.body)
+
+        logger.debug("%d submissions selected for training", len(titles))
+        link_submission_chance = len(self.link_submissions) / float(
+            len(titles) or 0.001
+        )
+        jobs = [
+            ("title", 2, titles, dict(link_submission_chance=link_submission_chance))
+        ]
+
+        if selftexts:
+            avg_selftext_len = selftext_len / float(len(selftexts))
+            avg_selftext_len = min(250, avg_selftext_len)
+            # if the average selftext length is very low, we won't even bother
+            # creating a model, and will submit with only titles
+            if avg_selftext_len <= 50:
+                state_size = None
+            elif avg_selftext_len >= 140:
+                state_size = 3
+            else:
+                state_size = 2
+
+            jobs.append(
+                (
+                    "selftext",
+                    state_size,
+                    selftexts,
+                    dict(avg_selftext_len=avg_selftext_len),
+                )
+            )
+
+        return jobs
+
+    def train(self, jobs):
+        for kind, state_size, texts, stats in jobs:
+            for name, value in stats.items():
+                setattr(self, name, value)
+
+            if not state_size:
+                setattr(self, f"{kind}_model", None)
+                continue
+
+            try:
+                model = self.get_model(kind, state_size, texts, **stats)
+            except (ValueError, IndexError) as err:
+                logger.error("Cannot construct %s model: %s", kind, err, exc_info=True)
+                model = None
+
+            setattr(self, f"{kind}_model", model)
+            if model is None:
+                return False
 
         return True
 
+    def train_from_comments(self, get_new_comments=True):
+        echo(
+            "$FG_WHITE${DIM}Getting ${new}comments for training ",
+            max_length=-1,
+            new="new " if get_new_comments else " ",
+            file=self.output,
+        )
+
+        if get_new_comments:
+            self.get_comments_from_site()
+
+        comments = self.get_comments_for_training()
+        return self.train(self.comment_training_jobs(comments))
+
     def train_from_submissions(self, get_new_submissions=True):
         if get_new_submissions:
+            # Once there is a cursor, submissions are fetched from the new
+            # listing whatever `top_of`, so it's not fetched twice.
+            has_cursor = self.get_cursor("submission") is not None
             submissions = self.get_submissions_from_site(top_of="day")
-            if not submissions:
+            if not submissions and not has_cursor:
                 submissions = self.get_submissions_from_site(top_of="all")
             if not submissions:
                 submissions = self.get_submissions_for_training()
         else:
             submissions = self.get_submissions_for_training()
 
-        titles = []
-        selftexts = []
-        self.link_submissions = []
-
-        logger.debug("%d submissions selected for training", len(submissions))
-        for submission in submissions:
-            titles.append(submission.title)
-            if submission.url:
-                self.link_submissions.append(submission)
-            else:
-                selftexts.append(submission.body)
+        return self.train(self.submission_training_jobs(submissions))
 
-        self.link_submission_chance = len(self.link_submissions) / float(
-            len(submissions) or 0.001
+    @property
+    def generation_stats(self):
+        if not hasattr(self, "_generation_stats"):
+            self._generation_stats = GenerationStats()
+        return self._generation_stats
+
+    def generation_budget(self):
+        return GenerationBudget(
+            max_attempts=self.config.action_max_attempts,
+            max_seconds=self.config.action_max_seconds,
+            stats=self.generation_stats,
         )
 
-        logger.debug("%d titles extracted: %r", len(titles), titles)
-        try:
-            self.title_model = SubredditSimulatorText(" ".join(titles), state_size=2)
-        except (ValueError, IndexError) as err:
-            logger.error("Cannot construct title model: %s", err, exc_info=True)
-            self.title_model = None
-            return False
-
-        if selftexts:
-            self.avg_selftext_len = sum(len(s) for s in selftexts) / float(
-                len(selftexts)
-            )
-            self.avg_selftext_len = min(250, self.avg_selftext_len)
-            # if the average selftext length is very low, we won't even bother
-            # creating a model, and will submit with only titles
-            if self.avg_selftext_len <= 50:
-                self.selftext_model = None
-            else:
-                if self.avg_selftext_len >= 140:
-                    state_size = 3
-                else:
-                    state_size = 2
-                try:
-                    self.selftext_model = SubredditSimulatorText(
-                        " ".join(selftexts), state_size=state_size
-                    )
-                except (ValueError, IndexError) as err:
-                    logger.error(
-                        "Cannot construct selftext model: %s", err, exc_info=True
-                    )
-                    self.selftext_model = None
-                    return False
+    def sentence_budget(self, budget=None):
+        return (budget or self.generation_budget()).sentence(
+            max_attempts=self.config.sentence_max_attempts,
+            max_seconds=self.config.sentence_max_seconds,
+        )
 
-        return True
+    def log_generation(self, what, budget):
+        log = logger.warning if budget.exhausted else logger.info
+        log(
+            "Generated %s for %r from r/%s in %.2fs (%s); totals: %s",
+            what,
+            self.name,
+            self.subreddit,
+            budget.elapsed,
+            "budget exhausted" if budget.exhausted else "within budget",
+            self.generation_stats.summary(),
+        )
 
-    def make_comment_sentence(self):
-        return (
-            self.comment_model.make_sentence(
-                tries=10000,
-                max_overlap_total=MAX_OVERLAP_TOTAL,
-                max_overlap_ratio=MAX_OVERLAP_RATIO,
-            )
-            if self.comment_model
-            else None
+    def sentence_options(self, kind):
+        options = dict(
+            max_overlap_total=MAX_OVERLAP_TOTAL, max_overlap_ratio=MAX_OVERLAP_RATIO
+        )
+        if kind == "title":
+            options.update(max_chars=140)
+        return options
+
+    def make_sentence(self, kind, budget=None):
+        model = getattr(self, f"{kind}_model", None)
+        if not model:
+            return None
+
+        pool = getattr(self, "sentence_pool", None)
+        if pool is not None:
+            fingerprint, _ = self._models[kind]
+            sentence = pool.take(self.subreddit, kind, fingerprint)
+            if sentence:
+                return sentence
+
+        return model.make_sentence(
+            budget=self.sentence_budget(budget), **self.sentence_options(kind)
         )
 
+    def make_comment_sentence(self, budget=None):
+        return self.make_sentence("comment", budget)
+
     def build_comment(self):
+        budget = self.generation_budget()
         comment = []
-        while True:
+        while not budget.exhausted:
             # For each sentence, check how close to the average comment length
             # we are, then use the remaining percentage as the chance of
             # adding another sentence. For example, if we're at 70% of the
@@ -501,26 +1520,19 @@ class Account(Base):  # type: ignore
             if random.random() > continue_chance:
                 break
 
-            new_sentence = self.make_comment_sentence()
+            new_sentence = self.make_comment_sentence(budget)
             if not new_sentence:
                 continue
 
             comment.append(new_sentence)
 
+        self.log_generation("comment", budget)
         comment = self.comment_model.sentence_join(comment)
 
         return comment
 
-    def make_selftext_sentence(self):
-        return (
-            self.selftext_model.make_sentence(
-                tries=10000,
-                max_overlap_total=MAX_OVERLAP_TOTAL,
-                max_overlap_ratio=MAX_OVERLAP_RATIO,
-            )
-            if self.selftext_model
-            else None
-        )
+    def make_selftext_sentence(self, budget=None):
+        return self.make_sentence("selftext", budget)
 
     def post_comment_on(self, submission):
         comment = self.build_comment()
@@ -561,7 +1573,7 @@ class Account(Base):  # type: ignore
         self.db.add(self)
         self.db.flush()
         self.db.commit()
-        self.session  # force refresh
+        self.refresh(force=True)
         return True
 
     def pick_submission_type(self):
@@ -576,17 +1588,10 @@ class Account(Base):  # type: ignore
     def post_submission(self, subreddit, type=None):
         subreddit = self.session.subreddit(subreddit)
 
-        title = (
-            self.title_model.make_short_sentence(
-                140,
-                tries=10000,
-                max_overlap_total=MAX_OVERLAP_TOTAL,
-                max_overlap_ratio=MAX_OVERLAP_RATIO,
-            )
-            if self.title_model
-            else None
-        )
+        budget = self.generation_budget()
+        title = self.make_sentence("title", budget)
         if not title:
+            self.log_generation("no title", budget)
             return False
 
         title = title.rstrip(".")
@@ -613,14 +1618,15 @@ class Account(Base):  # type: ignore
 
         else:
             selftext = ""
-            while len(selftext) < self.avg_selftext_len:
+            while len(selftext) < self.avg_selftext_len and not budget.exhausted:
                 new_sentence = SubredditSimulatorText.prepare_sentance(
-                    self.make_selftext_sentence()
+                    self.make_selftext_sentence(budget)
                 )
                 if not new_sentence:
                     break
                 selftext += " " + new_sentence
             selftext = selftext.strip()
+            self.log_generation("submission", budget)
 
             # need to do this to be able to submit an empty self-post
             if len(selftext) == 0:
@@ -643,26 +1649,68 @@ class Account(Base):  # type: ignore
         self.db.add(self)
         self.db.flush()
         self.db.commit()
-        self.session  # force refresh
+        self.refresh(force=True)
         return True
 
 
+class HTMLNormalizer(html.parser.HTMLParser):
+    """Converts the HTML of comment / submission bodies to plain text.
+
+    A normalizer is reused for any number of texts, but can't be used by
+    several threads at once: normalize_html_text() uses one per thread.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def updatepos(self, i, j):
+        # Line numbers and offsets (getpos()) aren't needed, and keeping
+        # track of them is a tenth of the parsing time.
+        return j
+
+    def handle_data(self, data):
+        self.chunks.append(SubredditSimulatorText.prepare_sentance(data).strip())
+
+    def normalize(self, html_text):
+        if not html_text or not html_text.strip():
+            return ""
+
+        self.reset()
+        self.chunks = []
+        self.feed(html.unescape(html_text))
+        self.close()
+
+        return SubredditSimulatorText.prepare_sentance(" ".join(self.chunks))
+
+    def normalize_all(self, html_texts):
+        return [self.normalize(html_text) for html_text in html_texts]
+
+
+normalizers = threading.local()
+
+
+def thread_normalizer():
+    normalizer = getattr(normalizers, "normalizer", None)
+    if normalizer is None:
+        normalizer = normalizers.normalizer = HTMLNormalizer()
+    return normalizer
+
+
 def normalize_html_text(html_text):
-    if not html_text or not html_text.strip():
-        return ""
+    return thread_normalizer().normalize(html_text)
 
-    body = []
 
-    class Parser(html.parser.HTMLParser):
-        def handle_data(self, data):
-            body.append(SubredditSimulatorText.prepare_sentance(data))
+def normalize_html_texts(html_texts, executor=None):
+    """Normalize many HTML texts, in the worker processes of `executor` if set.
 
-    p = Parser()
-    p.feed(html.unescape(html_text))
-    p.close()
+    Texts are sent to the workers in chunks, each normalized with the
+    worker's own normalizer.
+    """
+    if executor is None:
+        return thread_normalizer().normalize_all(html_texts)
 
-    text = " ".join(map(str.strip, body))
-    return SubredditSimulatorText.prepare_sentance(text)
+    return list(executor.map(normalize_html_text, html_texts, chunksize=256))
 
 
 class Comment(Base):  # type: ignore
@@ -674,12 +1722,15 @@ class Comment(Base):  # type: ignore
     is_top_level = Column(Boolean)
     author = Column(String(20))
     body = Column(Text)
+    sentences = Column(JSONSerialized)
+    num_tokens = Column(Integer)
     score = Column(Integer)
     permalink = Column(Text)
 
     __table_args__ = (Index("ix_comment_subreddit_date", "subreddit", "date"),)
 
-    def __init__(self, comment, *, config=None):
+    def __init__(self, comment, *, config=None, body=None):
+        """Create a comment row; `body` is its body if already normalized."""
         self.id = comment.id
         self.config = config
         self.subreddit = comment.subreddit.display_name.lower()
@@ -691,11 +1742,35 @@ class Comment(Base):  # type: ignore
             self.author = comment.author.name
         else:
             self.author = "[deleted]"
-        self.body = normalize_html_text(comment.body_html or comment.body)
+        if body is None:
+            body = normalize_html_text(comment.body_html or comment.body)
+        self.body = body
+        self.sentences = SubredditSimulatorText.split(self.body)
+        self.num_tokens = SubredditSimulatorText.count_tokens(self.sentences)
         self.score = comment.score or 0
         permalink = getattr(comment, "permalink", "")
         self.permalink = f"{self.config.reddit_url}{permalink}"
 
+    @classmethod
+    def from_dump(cls, data, *, config=None, body=None):
+        """Create a comment from a Pushshift-style dump record."""
+        author = data.get("author")
+        return cls(
+            SimpleNamespace(
+                id=data["id"],
+                subreddit=SimpleNamespace(display_name=data["subreddit"]),
+                created_utc=float(data["created_utc"]),
+                parent_id=data.get("parent_id") or "",
+                author=SimpleNamespace(name=author) if author else None,
+                body_html=data.get("body_html"),
+                body=data.get("body") or "",
+                score=data.get("score"),
+                permalink=data.get("permalink") or "",
+            ),
+            config=config,
+            body=body,
+        )
+
 
 class Submission(Base):  # type: ignore
     __tablename__ = "submissions"
@@ -705,15 +1780,19 @@ class Submission(Base):  # type: ignore
     date = Column(DateTime)
     author = Column(String(20))
     title = Column(Text)
+    title_sentences = Column(JSONSerialized)
     url = Column(Text)
     body = Column(Text)
+    sentences = Column(JSONSerialized)
+    num_tokens = Column(Integer)
     score = Column(Integer)
     over_18 = Column(Boolean)
     permalink = Column(Text)
 
     __table_args__ = (Index("ix_submission_subreddit_date", "subreddit", "date"),)
 
-    def __init__(self, submission, *, config=None):
+    def __init__(self, submission, *, config=None, body=None):
+        """Create a submission row; `body` is its body if already normalized."""
         self.id = submission.id
         self.subreddit = submission.subreddit.display_name.lower()
         self.date = datetime.utcfromtimestamp(submission.created_utc)
@@ -722,14 +1801,51 @@ class Submission(Base):  # type: ignore
         else:
             self.author = "[deleted]"
         self.title = submission.title
+        self.title_sentences = SubredditSimulatorText.split(self.title)
         if submission.is_self:
-            self.body = normalize_html_text(submission.selftext_html)
+            if body is None:
+                body = normalize_html_text(submission.selftext_html)
+            self.body = body
+            self.sentences = SubredditSimulatorText.split(self.body)
             self.url = None
         else:
             self.body = None
+            self.sentences = None
             self.url = submission.url
+        self.num_tokens = SubredditSimulatorText.count_tokens(
+            self.title_sentences
+        ) + SubredditSimulatorText.count_tokens(self.sentences)
         self.score = submission.score or 0
         self.over_18 = submission.over_18
         self.config = config
         permalink = getattr(submission, "permalink", "")
         self.permalink = f"{self.config.reddit_url}{permalink}"
+
+    @classmethod
+    def from_dump(cls, data, *, config=None, body=None):
+        """Create a submission from a Pushshift-style dump record.
+
+        Link submissions without a URL (e.g. removed ones) raise ValueError,
+        as they have neither a URL nor a body to use.
+        """
+        author = data.get("author")
+        is_self = bool(data.get("is_self"))
+        if not is_self and not data.get("url"):
+            raise ValueError(f"Link submission {data['id']} has no URL")
+        return cls(
+            SimpleNamespace(
+                id=data["id"],
+                subreddit=SimpleNamespace(display_name=data["subreddit"]),
+                created_utc=float(data["created_utc"]),
+                author=SimpleNamespace(name=author) if author else None,
+                title=data["title"],
+                is_self=is_self,
+                selftext_html=data.get("selftext_html") or data.get("selftext"),
+                url=None if is_self else data.get("url"),
+                score=data.get("score"),
+                over_18=bool(data.get("over_18")),
+                permalink=data.get("permalink") or "",
+            ),
+            config=config,
+            body=body,
+        )
@@ -0,0 +1,151 @@
+import threading
+import time
+from collections import deque
+from logging import getLogger
+
+from .generation import GenerationBudget, GenerationStats
+
+logger = getLogger(__name__)
+
+# Pools failing to generate a sentence are retried after refill_seconds,
+# doubled after each failure up to that many times.
+MAX_BACKOFF_DOUBLINGS = 6
+
+
+class SentencePool:
+    """Sentences pre-generated in a background thread, per subreddit and kind.
+
+    Accounts register each model they train with register(), and draw
+    sentences with take() before generating them synchronously. Models are
+    retrained whenever their corpus changes, so the sentences of the
+    previous model keep being served until the new one has generated some.
+    Pools whose model fails to generate sentences (e.g. from a degenerate
+    corpus) are retried less and less often, until a new model is
+    registered.
+    """
+
+    def __init__(self, config=None):
+        self.config = config
+        self.size = config.sentence_pool_size
+        self.refill_seconds = config.sentence_pool_refill_seconds
+        self.lock = threading.Lock()
+        self.sources = {}
+        self.sentences = {}
+        self.stale = {}
+        self.failures = {}
+        self.retry_at = {}
+        self.stats = {}
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def register(self, subreddit, kind, fingerprint, generate):
+        """Register a `generate(budget)` callable for a model's sentences."""
+        key = (subreddit, kind)
+        with self.lock:
+            current = self.sources.get(key)
+            if current and current[0] == fingerprint:
+                return
+
+            # Serve the sentences of the previous model until the new one
+            # has some, rather than none at all.
+            if self.sentences.get(key):
+                self.stale[key] = self.sentences[key]
+            self.sources[key] = (fingerprint, generate)
+            self.sentences[key] = deque()
+            self.failures[key] = 0
+            self.retry_at[key] = 0.0
+            self.stats.setdefault(key, GenerationStats())
+
+        self.wakeup.set()
+
+    def take(self, subreddit, kind, fingerprint):
+        key = (subreddit, kind)
+        with self.lock:
+            current = self.sources.get(key)
+            if not current or current[0] != fingerprint:
+                return None
+
+            if self.sentences[key]:
+                sentence = self.sentences[key].popleft()
+            elif self.stale.get(key):
+                sentence = self.stale[key].popleft()
+            else:
+                return None
+
+        self.wakeup.set()
+        return sentence
+
+    def fill(self):
+        """Top up every pool, until full or stopped."""
+        with self.lock:
+            sources = list(self.sources.items())
+
+        for key, (fingerprint, generate) in sources:
+            while not self.stopped.is_set():
+                with self.lock:
+                    if self.sources.get(key, (None,))[0] != fingerprint:
+                        break
+                    if time.monotonic() < self.retry_at[key]:
+                        break
+                    if len(self.sentences[key]) >= self.size:
+                        self.stale.pop(key, None)
+                        break
+
+                budget = GenerationBudget(
+                    max_attempts=self.config.sentence_max_attempts,
+                    max_seconds=self.config.sentence_max_seconds,
+                    stats=self.stats[key],
+                )
+                sentence = generate(budget)
+
+                with self.lock:
+                    if self.sources.get(key, (None,))[0] != fingerprint:
+                        break
+
+                    if not sentence:
+                        self.backoff(key)
+                        break
+
+                    self.failures[key] = 0
+                    self.sentences[key].append(sentence)
+
+    def backoff(self, key):
+        doublings = min(self.failures[key], MAX_BACKOFF_DOUBLINGS)
+        delay = self.refill_seconds * 2**doublings
+        self.failures[key] += 1
+        self.retry_at[key] = time.monotonic() + delay
+        logger.debug(
+            "No %s sentence for r/%s, retrying in %.0fs", key[1], key[0], delay
+        )
+
+    def run(self):
+        logger.info("Sentence pool worker started")
+        while not self.stopped.is_set():
+            try:
+                self.fill()
+            except Exception:
+                logger.exception("Sentence pool worker failed to fill pools")
+
+            self.wakeup.wait(self.refill_seconds)
+            self.wakeup.clear()
+
+        logger.info("Sentence pool worker stopped")
+
+    def start(self):
+        if self.size <= 0 or self.thread is not None:
+            return
+
+        self.thread = threading.Thread(
+            target=self.run, name="sentence-pool", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            return
+
+        self.stopped.set()
+        self.wakeup.set()
+        self.thread.join()
+        self.thread = None
@@ -0,0 +1,160 @@
+import math
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from typing import Optional
+
+import attr
+import requests
+
+logger = getLogger(__name__)
+
+# Weight of the latest measure in the moving averages of latency and errors.
+EWMA_WEIGHT = 0.3
+
+
+def display_url(url):
+    """Return a proxy URL without its credentials, e.g. for logging."""
+    return url.rsplit("@", 1)[-1]
+
+
+@attr.s
+class ProxyStats:
+    """Moving averages of the latency and error rate of a proxy."""
+
+    latency: Optional[float] = attr.ib(default=None)
+    error_rate: float = attr.ib(default=0.0)
+    requests: int = attr.ib(default=0)
+    errors: int = attr.ib(default=0)
+
+    def record(self, latency: Optional[float], error: bool) -> None:
+        self.requests += 1
+        self.errors += error
+        self.error_rate += EWMA_WEIGHT * (error - self.error_rate)
+        if latency is not None:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += EWMA_WEIGHT * (latency - self.latency)
+
+
+class ProxyPool:
+    """The proxies of the proxy_*_csv settings, and the accounts using them.
+
+    The latency and errors of the proxies are tracked from the accounts'
+    responses and from health checks of proxy_check_url. Proxies are
+    unhealthy when their average error rate is above proxy_max_error_rate,
+    or their average latency above proxy_max_latency_seconds. Accounts are
+    assigned to the healthy proxy used by the fewest accounts (then the
+    fastest one), and moved away from proxies that are unhealthy or used
+    by more than their share of the accounts.
+    """
+
+    def __init__(self, config=None, transport=None):
+        self.urls = config.proxy_urls
+        self.check_url = config.proxy_check_url
+        self.check_timeout = config.proxy_check_timeout_seconds
+        self.max_error_rate = config.proxy_max_error_rate
+        self.max_latency = config.proxy_max_latency_seconds
+        self.verify = not config.allow_self_signed_ssl_certs
+        self.transport = transport
+        self.lock = threading.Lock()
+        self.stats = {url: ProxyStats() for url in self.urls}
+        self.accounts = {}
+
+    def record(self, url, latency=None, error=False):
+        with self.lock:
+            if url in self.stats:
+                self.stats[url].record(latency, error)
+
+    def observe(self, session):
+        """Record the latency and errors of the requests of a requests.Session.
+
+        Server errors count as errors, and so do requests failing to connect
+        (e.g. to the proxy) or timing out, which never get a response.
+        """
+        send = session.send
+
+        def observed_send(request, **kwargs):
+            try:
+                response = send(request, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.record(session.proxies.get("https"), error=True)
+                raise
+
+            self.record(
+                session.proxies.get("https"),
+                response.elapsed.total_seconds(),
+                response.status_code >= 500,
+            )
+            return response
+
+        session.send = observed_send
+
+    def is_healthy(self, url):
+        stats = self.stats[url]
+        if stats.error_rate > self.max_error_rate:
+            return False
+        return stats.latency is None or stats.latency <= self.max_latency
+
+    def assign(self, name, current=""):
+        """Return the proxy URL account `name` should use, instead of `current`.
+
+        The current proxy is kept if it's healthy and not overloaded, or if
+        no proxy is healthy.
+        """
+        with self.lock:
+            self.accounts.pop(name, None)
+            loads = Counter(self.accounts.values())
+            healthy = [url for url in self.urls if self.is_healthy(url)]
+            share = math.ceil((len(self.accounts) + 1) / max(len(healthy), 1))
+
+            if current in healthy and loads[current] < share:
+                url = current
+            elif healthy:
+                url = min(
+                    healthy,
+                    key=lambda url: (
+                        loads[url],
+                        self.stats[url].latency or 0.0,
+                    ),
+                )
+            else:
+                url = current or min(self.urls, key=loads.__getitem__)
+
+            self.accounts[name] = url
+            return url
+
+    def check_proxy(self, url):
+        session = self.transport.session(url, self.verify)
+        started = time.monotonic()
+        try:
+            response = session.get(self.check_url, timeout=self.check_timeout)
+            response.raise_for_status()
+        except requests.RequestException as err:
+            logger.warning(
+                "Proxy %s failed its health check: %s", display_url(url), err
+            )
+            self.record(url, error=True)
+        else:
+            self.record(url, time.monotonic() - started)
+
+    def check(self, num_threads=1):
+        """Health check all the proxies, in up to `num_threads` threads."""
+        with ThreadPoolExecutor(max_workers=max(num_threads, 1)) as executor:
+            list(executor.map(self.check_proxy, self.urls))
+
+        with self.lock:
+            return [url for url in self.urls if not self.is_healthy(url)]
+
+    def summary(self):
+        with self.lock:
+            loads = Counter(self.accounts.values())
+            return ", ".join(
+                f"{display_url(url)} ({loads[url]} account(s), "
+                f"latency={stats.latency or 0.0:.2f}s, "
+                f"error_rate={stats.error_rate:.2f})"
+                for url, stats in self.stats.items()
+            )
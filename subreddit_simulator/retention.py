@@ -0,0 +1,162 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+from logging import getLogger
+from pathlib import Path
+
+from sqlalchemy import case, func
+
+from .models import Comment, Submission, training_filters, training_tokens
+from .utils import echo
+
+logger = getLogger(__name__)
+
+
+def training_cutoff(db, model, subreddit, config):
+    """Return the date of the oldest row the newest training corpus needs.
+
+    That's the newest max_corpus_size rows eligible for training or, with a
+    training_token_budget, the newest eligible rows up to that many tokens.
+    None is returned if the eligible rows don't fill the corpus.
+    """
+    filters = (model.subreddit == subreddit, *training_filters(model, config))
+    if not config.training_token_budget:
+        return (
+            db.query(model.date)
+            .filter(*filters)
+            .order_by(model.date.desc())
+            .offset(max(config.max_corpus_size, 1) - 1)
+            .limit(1)
+            .scalar()
+        )
+
+    running = (
+        db.query(
+            model.date,
+            func.sum(training_tokens(model))
+            .over(order_by=(model.date.desc(), model.id), rows=(None, 0))
+            .label("running_tokens"),
+        )
+        .filter(*filters)
+        .subquery()
+    )
+    within_budget = running.c.running_tokens <= config.training_token_budget
+    oldest, total = db.query(
+        func.min(case([(within_budget, running.c.date)])),
+        func.max(running.c.running_tokens),
+    ).one()
+    if total is None or total <= config.training_token_budget:
+        return None
+    return oldest
+
+
+def retention_cutoff(db, model, subreddit, config):
+    """Return the date before which rows of a subreddit can be pruned.
+
+    The newest retention_rows are kept, as well as the rows of the last
+    retention_days if set, and at least the rows the training corpus
+    needs (see training_cutoff()).
+    """
+    oldest_kept = (
+        db.query(model.date)
+        .filter(model.subreddit == subreddit)
+        .order_by(model.date.desc())
+        .offset(max(config.retention_rows, 1) - 1)
+        .limit(1)
+        .scalar()
+    )
+    oldest_trained = training_cutoff(db, model, subreddit, config)
+    if oldest_kept is None or oldest_trained is None:
+        return None
+
+    cutoff = min(oldest_kept, oldest_trained)
+    if config.retention_days:
+        since = datetime.utcnow() - timedelta(days=config.retention_days)
+        return min(cutoff, since)
+
+    return cutoff
+
+
+def archive_rows(path, rows):
+    columns = [(column.name, column.key) for column in rows[0].__table__.columns]
+    with gzip.open(path, "at", encoding="utf-8") as archive:
+        for row in rows:
+            data = {name: getattr(row, key) for name, key in columns}
+            archive.write(json.dumps(data, default=str) + "\n")
+
+
+def prune_rows(db, model, subreddit, cutoff, config):
+    """Delete (and archive) rows older than `cutoff` in batches."""
+    archive_path = None
+    if config.retention_archive_dir:
+        archive_dir = Path(config.retention_archive_dir)
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        archive_path = archive_dir.joinpath(
+            f"{model.__tablename__}-{datetime.utcnow():%Y%m%d}.ndjson.gz"
+        )
+
+    num_pruned = 0
+    while True:
+        ids = [
+            id
+            for id, in db.query(model.id)
+            .filter(model.subreddit == subreddit, model.date < cutoff)
+            .limit(config.retention_batch_size)
+        ]
+        if not ids:
+            break
+
+        if archive_path is not None:
+            archive_rows(archive_path, db.query(model).filter(model.id.in_(ids)).all())
+
+        db.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        num_pruned += len(ids)
+        logger.debug(
+            "Pruned %d %s of %r older than %s",
+            num_pruned,
+            model.__tablename__,
+            subreddit,
+            cutoff,
+        )
+
+    return num_pruned
+
+
+def vacuum(db, tables):
+    """Reclaim the space of deleted rows and update the planner statistics."""
+    engine = db.get_bind()
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for table in tables:
+                conn.execute(f"VACUUM ANALYZE {table}")
+
+    elif engine.dialect.name == "sqlite":
+        # The sqlite3 module doesn't open transactions for these statements.
+        with engine.connect() as conn:
+            conn.execute("VACUUM")
+            conn.execute("ANALYZE")
+
+
+def prune_corpus(config, db, output=None):
+    """Prune the comments and submissions outside the retention window."""
+    if not config.retention_rows and not config.retention_days:
+        return False, "Neither retention_rows nor retention_days is set!"
+
+    pruned = {}
+    for model in (Comment, Submission):
+        pruned[model] = 0
+        subreddits = [subreddit for subreddit, in db.query(model.subreddit).distinct()]
+        for subreddit in subreddits:
+            cutoff = retention_cutoff(db, model, subreddit, config)
+            if cutoff is not None:
+                pruned[model] += prune_rows(db, model, subreddit, cutoff, config)
+
+    if any(pruned.values()) and config.retention_vacuum:
+        echo("$FG_WHITE${DIM}Vacuuming the database...", file=output)
+        vacuum(db, [model.__tablename__ for model in pruned])
+
+    return (
+        True,
+        f"{pruned[Comment]} comment(s) and {pruned[Submission]} submission(s) pruned",
+    )
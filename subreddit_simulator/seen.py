@@ -0,0 +1,123 @@
+import hashlib
+import math
+import threading
+from datetime import datetime, timedelta
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+
+class BloomFilter:
+    """A fixed size set of strings answering "maybe" or "definitely not"."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = int(-capacity * math.log(error_rate) / math.log(2) ** 2) + 1
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self.positions(key)
+        )
+
+
+class SeenIdIndex:
+    """IDs of the comments / submissions already stored, per subreddit.
+
+    The IDs of the rows of the last `window_days` (or all rows, if 0) are
+    loaded with a single ID-only query the first time a subreddit is seen,
+    and kept up to date with add() as new rows are stored. The window
+    slides with time, and the IDs are loaded again once it slid by
+    REBUILD_FRACTION of its length, dropping the older ones. With a Bloom
+    filter capacity, IDs are kept in a BloomFilter instead of a set, and
+    its possible false positives are checked against the database.
+    """
+
+    # Fraction of the window after which the IDs are loaded again, so at
+    # most the IDs of 1 + REBUILD_FRACTION windows are kept.
+    REBUILD_FRACTION = 0.25
+
+    def __init__(self, config=None):
+        self.window_days = config.seen_ids_window_days
+        self.bloom_capacity = config.seen_ids_bloom_capacity
+        self.lock = threading.Lock()
+        self.indexes = {}
+
+    def index(self, db, model, subreddit):
+        """Return the start of the window, and the IDs of rows stored since."""
+        key = (model.__tablename__, subreddit)
+        since = rebuild_since = None
+        if self.window_days:
+            window = timedelta(days=self.window_days)
+            since = datetime.utcnow() - window
+            rebuild_since = since - window * self.REBUILD_FRACTION
+
+        with self.lock:
+            if key in self.indexes:
+                loaded_since, ids = self.indexes[key]
+                if rebuild_since is None or loaded_since >= rebuild_since:
+                    return since, ids
+
+        query = db.query(model.id).filter(model.subreddit == subreddit)
+        if since is not None:
+            query = query.filter(model.date >= since)
+
+        ids = BloomFilter(self.bloom_capacity) if self.bloom_capacity else set()
+        num_ids = 0
+        for (id,) in query.yield_per(1000):
+            ids.add(id)
+            num_ids += 1
+        logger.debug("Loaded %d seen %s ID(s) for %r", num_ids, key[0], subreddit)
+
+        with self.lock:
+            # Keep the IDs loaded meanwhile by another thread, if more recent.
+            loaded = self.indexes.get(key)
+            if loaded is None or (since is not None and loaded[0] < since):
+                self.indexes[key] = (since, ids)
+            return since, self.indexes[key][1]
+
+    def new_rows(self, db, model, subreddit, rows):
+        """Return the `rows` not stored yet.
+
+        Only rows older than the window, or possibly seen according to the
+        Bloom filter, are looked up in the database.
+        """
+        since, ids = self.index(db, model, subreddit)
+        exact = isinstance(ids, set)
+
+        unknown = []
+        for row in rows:
+            if row.id in ids:
+                if not exact:
+                    unknown.append(row.id)
+            elif since is not None and row.date < since:
+                unknown.append(row.id)
+
+        stored = set()
+        if unknown:
+            stored = {id for id, in db.query(model.id).filter(model.id.in_(unknown))}
+
+        return [
+            row
+            for row in rows
+            if row.id not in stored and not (exact and row.id in ids)
+        ]
+
+    def add(self, model, subreddit, ids):
+        key = (model.__tablename__, subreddit)
+        with self.lock:
+            if key in self.indexes:
+                for id in ids:
+                    self.indexes[key][1].add(id)
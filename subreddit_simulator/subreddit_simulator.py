@@ -1,14 +1,23 @@
 import html.parser
 import random
 import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from logging import getLogger
 from operator import attrgetter
 
 import praw
+import prawcore
 import pytz
-
-from .models import Account
+import requests
+
+from . import retention
+from .listings import ListingCache
+from .models import Account, Comment, Submission, train_model
+from .pools import SentencePool
+from .proxies import ProxyPool
+from .seen import SeenIdIndex
+from .transport import Transport
 from .utils import echo
 
 logger = getLogger(__name__)
@@ -25,6 +34,13 @@ class Simulator:
         self.accounts = {}
         self.subreddit = self.config.subreddit
         self.output = output
+        self.sentence_pool = SentencePool(config=self.config)
+        self.seen_ids = SeenIdIndex(config=self.config)
+        self.listings = ListingCache(config=self.config)
+        self.transport = Transport(config=self.config)
+        self.proxies = None
+        if self.config.random_proxy_per_account and self.config.proxy_urls:
+            self.proxies = ProxyPool(config=self.config, transport=self.transport)
         logger.info("Configured subreddit:  %r", self.subreddit)
 
         logger.debug("Loading accounts from the database...")
@@ -43,15 +59,156 @@ class Simulator:
             account.config = self.config
             account.engine = self.engine
             account.db = self.db
-
-            logger.debug("Establishing Reddit session for %r", account.name)
-            account.session  # force a login to ensure account is up-to-date
+            account.sentence_pool = self.sentence_pool
+            account.seen_ids = self.seen_ids
+            account.transport = self.transport
+            account.proxies = self.proxies
 
             self.accounts[subreddit] = account
 
         self.mod_account = self.accounts[self.subreddit]
+        self.login_accounts()
         logger.info("%d accounts loaded and initialized", len(self.accounts))
 
+        self.sentence_pool.start()
+
+    def login_accounts(self):
+        """Log the accounts in to ensure they are up-to-date, per login_mode.
+
+        Accounts log in one after the other with "sequential", up to
+        login_threads at a time with "concurrent", and only when first used
+        with "lazy". Accounts that fail to log in are reported, and try
+        again when used.
+        """
+        if self.config.login_mode == "lazy":
+            logger.info("Accounts will log in when first used")
+            return
+
+        if self.config.login_mode == "concurrent":
+            num_threads = max(self.config.login_threads, 1)
+        elif self.config.login_mode == "sequential":
+            num_threads = 1
+        else:
+            raise ValueError(f"Unknown login mode: {self.config.login_mode!r}")
+
+        def login(session):
+            return session, session.user.me(use_cache=False)
+
+        failed = []
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            # Sessions are created here as they use the accounts' rows, but
+            # only authenticate when the workers first use them.
+            futures = {
+                executor.submit(login, account.login()): account
+                for account in self.accounts.values()
+            }
+
+            for future in as_completed(futures):
+                account = futures[future]
+                try:
+                    account.use_session(*future.result())
+                except (
+                    praw.exceptions.PRAWException,
+                    prawcore.exceptions.PrawcoreException,
+                    requests.RequestException,
+                ) as err:
+                    echo(
+                        "$FG_RED${BOLD}Cannot log in as ${name}:$NORMAL ${err}",
+                        name=account.name,
+                        err=str(err),
+                        file=self.output,
+                        max_length=-1,
+                    )
+                    failed.append(account.name)
+
+        if failed:
+            logger.error(
+                "%d of %d account(s) failed to log in: %s",
+                len(failed),
+                len(self.accounts),
+                ", ".join(sorted(failed)),
+            )
+
+    def refresh_tokens(self):
+        """Renew the access tokens of the accounts before they expire.
+
+        Tokens expiring in less than token_refresh_margin_seconds are
+        renewed in up to login_threads worker threads, and stored with
+        the accounts so they can be reused after a restart.
+        """
+        margin = self.config.token_refresh_margin_seconds
+        accounts = [
+            account
+            for account in self.accounts.values()
+            if account.token_expiring(margin)
+        ]
+        if not accounts:
+            return True, "0 account(s)"
+
+        num_failed = 0
+        num_threads = max(self.config.login_threads, 1)
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            futures = {
+                executor.submit(account.renew_token): account for account in accounts
+            }
+
+            for future in as_completed(futures):
+                account = futures[future]
+                try:
+                    future.result()
+                except (
+                    prawcore.exceptions.PrawcoreException,
+                    requests.RequestException,
+                ) as err:
+                    logger.error("Cannot renew the token of %r: %s", account.name, err)
+                    num_failed += 1
+                    continue
+
+                account.store_token()
+
+        self.db.commit()
+        if num_failed:
+            return False, f"Cannot renew {num_failed} of {len(accounts)} token(s)!"
+
+        return True, f"{len(accounts)} account(s)"
+
+    def check_proxies(self):
+        """Health check the proxies, and move accounts off the bad ones.
+
+        Proxies are checked in up to login_threads threads. Accounts using
+        a proxy that is unhealthy or used by more than its share of the
+        accounts are moved to a healthy one.
+        """
+        if self.proxies is None:
+            return False, "No proxies are used!"
+
+        unhealthy = self.proxies.check(self.config.login_threads)
+        num_moved = 0
+        for account in self.accounts.values():
+            proxy_url = self.proxies.assign(account.name, account.proxy_url)
+            if proxy_url != account.proxy_url:
+                logger.info("Moving account %r to another proxy", account.name)
+                account.use_proxy(proxy_url)
+                num_moved += 1
+
+        self.db.commit()
+        logger.info("Proxies: %s", self.proxies.summary())
+        return (
+            True,
+            f"{len(self.proxies.urls)} proxy(ies): {len(unhealthy)} unhealthy, "
+            f"{num_moved} account(s) moved",
+        )
+
+    def close(self):
+        logger.info("HTTP connections: %s", self.transport.summary())
+        self.sentence_pool.stop()
+        self.save_models()
+
+    def save_models(self):
+        """Cache the models of all accounts trained or updated since saved."""
+        num_saved = sum(account.save_models() for account in self.accounts.values())
+        return True, f"{num_saved} model(s)"
+
     def timedelta_since_last_comment(self, account):
         logger.debug("Checking time since account %r last commented...", account.name)
         min_interval = timedelta(seconds=self.config.min_seconds_since_last_comment)
@@ -343,6 +500,179 @@ class Simulator:
 
         return result
 
+    def train_models(self):
+        """Train the models of all accounts in parallel worker processes.
+
+        Models that are already cached, or can be updated incrementally, are
+        reused in this process; the rest are trained from scratch with one
+        task per subreddit and model kind. Workers return the models in the
+        model file layout, so they're used here in the compact representation
+        without being rebuilt.
+        """
+        jobs = []
+        for account in self.accounts.values():
+            if account.can_comment:
+                comments = account.get_comments_for_training()
+                jobs += [
+                    (account, job) for job in account.comment_training_jobs(comments)
+                ]
+
+            if account.can_submit:
+                submissions = account.get_submissions_for_training()
+                jobs += [
+                    (account, job)
+                    for job in account.submission_training_jobs(submissions)
+                ]
+
+        pending = []
+        for account, (kind, state_size, texts, stats) in jobs:
+            for name, value in stats.items():
+                setattr(account, name, value)
+
+            if not state_size:
+                setattr(account, f"{kind}_model", None)
+                continue
+
+            try:
+                model = account.get_model(kind, state_size, texts, train=False, **stats)
+            except (ValueError, IndexError) as err:
+                logger.error("Cannot construct %s model: %s", kind, err, exc_info=True)
+                continue
+
+            if model is None:
+                pending.append((account, kind, state_size, texts, stats))
+            else:
+                setattr(account, f"{kind}_model", model)
+
+        echo(
+            "$FG_WHITE${DIM}Training $BOLD${num_jobs}$NORMAL$DIM model(s) "
+            "(reusing $BOLD${num_reused}$NORMAL$DIM) in worker processes...",
+            file=self.output,
+            num_jobs=len(pending),
+            num_reused=len(jobs) - len(pending),
+            max_length=-1,
+        )
+
+        num_failed = 0
+        with ProcessPoolExecutor(
+            max_workers=self.config.training_processes or None
+        ) as executor:
+            futures = {}
+            for job in pending:
+                account, kind, state_size, texts, stats = job
+                futures[executor.submit(train_model, state_size, texts)] = job
+
+            for future in as_completed(futures):
+                account, kind, state_size, texts, stats = futures[future]
+                try:
+                    model = account.get_model(
+                        kind, state_size, texts, trained=future.result(), **stats
+                    )
+                except (ValueError, IndexError) as err:
+                    logger.error(
+                        "Cannot construct %s model for %r: %s",
+                        kind,
+                        account.subreddit,
+                        err,
+                    )
+                    model = None
+                    num_failed += 1
+
+                setattr(account, f"{kind}_model", model)
+
+        self.save_models()
+        if num_failed:
+            return False, f"Cannot train {num_failed} of {len(jobs)} model(s)!"
+
+        return True, f"{len(self.accounts)} account(s)"
+
+    def harvest(self):
+        """Fetch new comments and submissions for all accounts concurrently.
+
+        Each account's subreddit is fetched with its own Reddit session in a
+        worker thread, so requests are spread across the accounts and each of
+        them is rate limited by its session. Rows are stored in this thread
+        as fetches complete. Accounts that aren't logged in yet log in from
+        the workers, and those failing to log in or fetch are reported
+        without stopping the others.
+        """
+        num_threads = max(self.config.harvest_threads, 1)
+        errors = (
+            praw.exceptions.PRAWException,
+            prawcore.exceptions.PrawcoreException,
+            requests.RequestException,
+        )
+
+        jobs = {}
+        num_failed = 0
+        for account in self.accounts.values():
+            # Sessions already in use are used as they are, without refreshing
+            # the accounts. Others are created here as they use the accounts'
+            # rows, but only log in when the workers first use them.
+            session = getattr(account, "_session", None)
+            try:
+                jobs[account.subreddit] = (
+                    account,
+                    session or account.login(),
+                    session is None,
+                    account.get_cursor("comment"),
+                    account.get_cursor("submission"),
+                )
+            except errors as err:
+                logger.error("Cannot harvest %r: %s", account.subreddit, err)
+                num_failed += 1
+
+        echo(
+            "$FG_WHITE${DIM}Harvesting $BOLD${num_subreddits}$NORMAL$DIM "
+            "subreddit(s) with up to $BOLD${num_threads}$NORMAL$DIM thread(s)...",
+            file=self.output,
+            num_subreddits=len(jobs),
+            num_threads=num_threads,
+            max_length=-1,
+        )
+
+        def fetch(account, session, login, comment_cursor, submission_cursor):
+            me = session.user.me(use_cache=False) if login else None
+            comments = account.fetch_comments(session, comment_cursor)
+            submissions = account.fetch_submissions(session, submission_cursor)
+            return me, comments, submissions
+
+        num_comments = num_submissions = 0
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            futures = {executor.submit(fetch, *job): job for job in jobs.values()}
+
+            for future in as_completed(futures):
+                account, session, *_ = futures[future]
+                try:
+                    me, comments, submissions = future.result()
+                except errors as err:
+                    logger.error("Cannot harvest %r: %s", account.subreddit, err)
+                    num_failed += 1
+                    continue
+
+                if me is not None:
+                    account.use_session(session, me)
+                num_comments += len(account.store_new(Comment, comments))
+                num_submissions += len(account.store_new(Submission, submissions))
+                account.update_cursor("comment", comments)
+                account.update_cursor("submission", submissions)
+
+        if num_failed:
+            return (
+                False,
+                f"Cannot harvest with {num_failed} of {len(self.accounts)} "
+                "account(s)!",
+            )
+
+        return (
+            True,
+            f"{len(jobs)} account(s): {num_comments} new comment(s), "
+            f"{num_submissions} new submission(s)",
+        )
+
+    def prune_corpus(self):
+        return retention.prune_corpus(self.config, self.db, self.output)
+
     def make_comment(self):
         account = self.pick_account_to_comment()
         if not account:
@@ -361,8 +691,9 @@ class Simulator:
             max_length=-1,
         )
 
-        subreddit = account.session.subreddit(self.subreddit)
-        submissions = subreddit.new(limit=limit)
+        submissions = self.listings.get(
+            account.session, self.subreddit, "new", limit=limit
+        )
 
         candidates = []
         for submission in submissions:
@@ -378,7 +709,9 @@ class Simulator:
                 max_length=-1,
             )
 
-            submissions = subreddit.top("all", limit=limit)
+            submissions = self.listings.get(
+                account.session, self.subreddit, "top", "all", limit=limit
+            )
             for submission in submissions:
                 candidates += [submission]
 
@@ -412,8 +745,9 @@ class Simulator:
 
         max_candidates = 15
 
-        subreddit = account.session.subreddit(self.subreddit)
-        submissions = subreddit.hot(limit=25)
+        submissions = self.listings.get(
+            account.session, self.subreddit, "hot", limit=25
+        )
 
         fullname_to_permalink = {}
 
@@ -427,7 +761,9 @@ class Simulator:
                 candidates.append(submission.fullname)
 
         else:
-            submissions = subreddit.new(limit=50)
+            submissions = self.listings.get(
+                account.session, self.subreddit, "new", limit=50
+            )
             for submission in submissions:
                 if len(candidates) >= max_candidates // 2:
                     break
@@ -436,7 +772,10 @@ class Simulator:
                     fullname_to_permalink[submission.fullname] = submission.permalink
                     candidates.append(submission.fullname)
 
-        for comment in subreddit.comments(limit=25):
+        comments = self.listings.get(
+            account.session, self.subreddit, "comments", limit=25
+        )
+        for comment in comments:
             if len(candidates) >= max_candidates:
                 break
 
@@ -0,0 +1,122 @@
+import socket
+import threading
+from logging import getLogger
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+logger = getLogger(__name__)
+
+
+def keep_alive_socket_options(idle_seconds):
+    """Return socket options probing idle connections after `idle_seconds`."""
+    options = list(HTTPConnection.default_socket_options)
+    if idle_seconds <= 0:
+        return options
+
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle_seconds))
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, idle_seconds))
+    return options
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """An HTTPAdapter keeping its connections, and those via proxies, alive."""
+
+    def __init__(self, socket_options=None, **kwargs):
+        self.socket_options = socket_options
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.socket_options is not None:
+            kwargs["socket_options"] = self.socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        if self.socket_options is not None:
+            proxy_kwargs.setdefault("socket_options", self.socket_options)
+        return super().proxy_manager_for(proxy, **proxy_kwargs)
+
+    def connection_pools(self):
+        managers = [self.poolmanager, *self.proxy_manager.values()]
+        return [
+            manager.pools[key] for manager in managers for key in manager.pools.keys()
+        ]
+
+
+class Transport:
+    """HTTP connection pools shared by the accounts' Reddit sessions.
+
+    Accounts using the same proxy (or none) and TLS verification share a
+    KeepAliveAdapter with up to http_pool_maxsize connections per host,
+    so connections (and their TLS handshakes) are reused across accounts.
+    Each account still gets its own requests.Session, so cookies are not
+    shared.
+    """
+
+    def __init__(self, config=None):
+        self.pool_connections = config.http_pool_connections
+        self.pool_maxsize = config.http_pool_maxsize
+        self.socket_options = keep_alive_socket_options(config.http_keep_alive_seconds)
+        self.lock = threading.Lock()
+        self.adapters = {}
+
+    def adapter(self, proxy_url="", verify=True):
+        key = (proxy_url, verify)
+        with self.lock:
+            if key not in self.adapters:
+                logger.debug("New connection pools for %r", key)
+                self.adapters[key] = KeepAliveAdapter(
+                    socket_options=self.socket_options,
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize,
+                )
+            return self.adapters[key]
+
+    def session(self, proxy_url="", verify=True, session=None):
+        """Return a new requests.Session using the shared pools of its key.
+
+        An existing `session` is moved to the pools of the key instead.
+        """
+        if session is None:
+            session = requests.Session()
+        adapter = self.adapter(proxy_url, verify)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.verify = verify
+        session.proxies = {}
+        if proxy_url:
+            session.proxies = {
+                "https": proxy_url,
+                "http": proxy_url.replace("https:", "http:"),
+            }
+        return session
+
+    def stats(self):
+        """Return the requests, new connections and reused ones per pool key.
+
+        Connections that failed (e.g. to a proxy) count as new connections
+        without requests. Pools closed when too many hosts are used are not
+        accounted for.
+        """
+        with self.lock:
+            adapters = dict(self.adapters)
+
+        stats = {}
+        for key, adapter in adapters.items():
+            num_requests = num_connections = num_reused = 0
+            for pool in adapter.connection_pools():
+                num_requests += pool.num_requests
+                num_connections += pool.num_connections
+                num_reused += max(pool.num_requests - pool.num_connections, 0)
+            stats[key] = (num_requests, num_connections, num_reused)
+        return stats
+
+    def summary(self):
+        totals = [sum(counts) for counts in zip((0, 0, 0), *self.stats().values())]
+        return (
+            "{} request(s), {} new connection(s), {} reused connection(s) "
+            "in {} pool(s)".format(*totals, len(self.adapters))
+        )
@@ -0,0 +1,85 @@
+import io
+
+import praw
+import prawcore
+import pytest
+
+from subreddit_simulator.config import Config
+from subreddit_simulator.database import Engine
+from subreddit_simulator.models import Account, Base
+
+
+@pytest.fixture(autouse=True)
+def no_update_check(monkeypatch):
+    """Keep praw from checking PyPI for a newer version."""
+    monkeypatch.setenv("praw_check_for_updates", "False")
+
+
+@pytest.fixture
+def no_network(monkeypatch):
+    """Fail any HTTP request made through prawcore."""
+
+    def request(*args, **kwargs):
+        raise AssertionError("unexpected HTTP request")
+
+    monkeypatch.setattr(prawcore.Requestor, "request", request)
+
+
+@pytest.fixture
+def make_reddit():
+    def make_reddit(username="bot"):
+        return praw.Reddit(
+            client_id="client-id",
+            client_secret="client-secret",
+            user_agent="tests",
+            username=username,
+            password="password",
+        )
+
+    return make_reddit
+
+
+@pytest.fixture
+def make_config(tmp_path):
+    def make_config(**kwargs):
+        kwargs.setdefault("client_id", "client-id")
+        kwargs.setdefault("client_secret", "client-secret")
+        kwargs.setdefault("user_agent", "tests")
+        return Config(
+            system="sqlite",
+            database=str(tmp_path / "test.db"),
+            subreddit="target",
+            **kwargs,
+        )
+
+    return make_config
+
+
+@pytest.fixture
+def config(make_config):
+    return make_config()
+
+
+@pytest.fixture
+def engine(config):
+    engine = Engine.from_config(config)
+    Base.metadata.create_all(engine.create())
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    session = engine.create_session()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def account(config, engine, db):
+    account = Account(
+        "bot", "password", "bitcoin", config=config, engine=engine, output=io.StringIO()
+    )
+    account.db = db
+    db.add(account)
+    db.commit()
+    return account
@@ -0,0 +1,64 @@
+import random
+
+import markovify
+
+from subreddit_simulator.models import (
+    OverlapIndex,
+    SubredditSimulatorChain,
+    SubredditSimulatorText,
+)
+
+TEXTS = {
+    "a": "The cat sat on the mat. The cat ate the fish.",
+    "b": "A dog sat on the rug. The dog ate the bone.",
+    "c": "The bird sat on the fence.",
+}
+
+
+def test_compiled_chain_keeps_no_dict_of_dicts():
+    runs = [text.split() for text in TEXTS.values()]
+    expected = markovify.Chain(runs, 2).model
+
+    chain = SubredditSimulatorChain(runs, 2)
+
+    assert "model" not in vars(chain)
+    assert chain.model == expected
+    assert SubredditSimulatorChain.from_json(chain.to_json()).model == expected
+
+
+def test_models_are_trained_without_markovify_text(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("trained with markovify")
+
+    monkeypatch.setattr(markovify.Text, "__init__", fail)
+    monkeypatch.setattr(markovify.Text, "sentence_join", fail)
+    monkeypatch.setattr(markovify.Chain, "__init__", fail)
+    model = SubredditSimulatorText.from_texts(TEXTS)
+
+    runs = [
+        run for text in TEXTS.values() for run in SubredditSimulatorText.parse(text)
+    ]
+    monkeypatch.undo()
+    assert model.chain.model == markovify.Chain(runs, 2).model
+    index = OverlapIndex()
+    for run in runs:
+        index.add(run)
+    assert vars(model.overlap_index) == vars(index)
+
+
+def test_update_matches_training_from_scratch():
+    model = SubredditSimulatorText.from_texts({"a": TEXTS["a"], "b": TEXTS["b"]})
+    model.update({"c": TEXTS["c"]}, removed=["b"])
+
+    expected = SubredditSimulatorText.from_texts({"a": TEXTS["a"], "c": TEXTS["c"]})
+    assert model.chain.model == expected.chain.model
+
+
+def test_walks_follow_the_counts():
+    begin = (markovify.chain.BEGIN,)
+    chain = SubredditSimulatorChain(
+        None, 1, model={begin: {"x": 1}, ("x",): {"a": 3, "b": 1}}
+    )
+    random.seed(0)
+    moves = [chain.move(("x",)) for _ in range(4000)]
+    assert 0.7 < moves.count("a") / len(moves) < 0.8
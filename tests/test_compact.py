@@ -0,0 +1,36 @@
+import gc
+import weakref
+
+from subreddit_simulator.models import SubredditSimulatorText
+
+
+def make_model(words):
+    texts = {i: f"The {word} went to the market today." for i, word in enumerate(words)}
+    model = SubredditSimulatorText.from_texts(texts)
+    model.compact()
+    return model
+
+
+def test_compact_models_have_their_own_vocabulary():
+    first = make_model(["cat", "dog"])
+    second = make_model(["fox", "owl"])
+
+    assert first.chain.vocabulary is first.overlap_index.vocabulary
+    assert first.chain.vocabulary is not second.chain.vocabulary
+    assert first.chain.vocabulary.lookup("fox") is None
+    assert second.chain.vocabulary.lookup("cat") is None
+    assert first.overlap_index.contains(["The", "cat", "went"])
+    assert not second.overlap_index.contains(["The", "cat", "went"])
+    assert first.make_sentence(test_output=False).startswith("The ")
+
+
+def test_retrained_models_release_their_vocabulary():
+    model = make_model([f"word{i}" for i in range(50)])
+    vocabulary = weakref.ref(model.chain.vocabulary)
+    size = len(vocabulary())
+
+    model = make_model([f"other{i}" for i in range(50)])
+    gc.collect()
+
+    assert vocabulary() is None
+    assert len(model.chain.vocabulary) == size
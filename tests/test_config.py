@@ -0,0 +1,37 @@
+from pathlib import Path
+
+from subreddit_simulator.cli import update_db_config
+from subreddit_simulator.config import Config
+
+DATA = Path(__file__).with_name("data")
+PACKAGE = Path(__file__).parent.parent / "subreddit_simulator"
+
+
+def test_example_config_loads():
+    config = Config.from_file(str(PACKAGE / "subreddit_simulator.cfg.example"))
+
+    assert config.subreddit == "projectoblio"
+
+
+def test_config_without_new_settings_keeps_defaults():
+    # The example config as it was before most settings were added.
+    config = Config.from_file(str(DATA / "baseline.cfg"))
+
+    default = Config()
+    assert config.subreddit == "projectoblio"
+    assert config.max_corpus_size == 1000
+    assert config.sentence_max_attempts == default.sentence_max_attempts
+    assert config.sentence_max_seconds == default.sentence_max_seconds
+    assert config.login_mode == default.login_mode
+
+
+def test_missing_bool_settings_keep_defaults(tmp_path):
+    file_config = Config.from_file(str(DATA / "baseline.cfg"))
+    file_config.system = "sqlite"
+    file_config.database = str(tmp_path / "test.db")
+
+    config, _ = update_db_config(file_config)
+
+    assert config.cache_trained_models
+    assert config.incremental_training
+    assert config.retention_vacuum
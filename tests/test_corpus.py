@@ -0,0 +1,79 @@
+import io
+import json
+
+from subreddit_simulator.corpus import import_corpus, read_dump
+from subreddit_simulator.models import Comment, Submission
+
+RECORDS = [
+    dict(id="c1", subreddit="Bitcoin", created_utc=1, body="A comment."),
+    dict(id="c2", subreddit="Bitcoin", created_utc=2, body="Another comment."),
+    dict(
+        id="s1",
+        subreddit="Bitcoin",
+        created_utc=3,
+        title="A self post",
+        is_self=True,
+        selftext="Its text.",
+    ),
+    dict(
+        id="s2",
+        subreddit="Bitcoin",
+        created_utc=4,
+        title="A link",
+        is_self=False,
+        url="https://example.com/",
+    ),
+    dict(id="s3", subreddit="Bitcoin", created_utc=5, title="A removed link"),
+    dict(id="c3", subreddit="Other", created_utc=6, body="Elsewhere."),
+]
+
+
+def write_dump(path, records):
+    path.write_text("".join(json.dumps(record) + "\n" for record in records))
+    return path
+
+
+def test_link_submissions_without_url_are_skipped(tmp_path, config):
+    path = write_dump(tmp_path / "dump.ndjson", RECORDS)
+
+    rows = list(read_dump(path, {"bitcoin"}, config=config))
+
+    assert [row.id for row in rows] == ["c1", "c2", "s1", "s2"]
+    assert [(row.url, row.body) for row in rows if isinstance(row, Submission)] == [
+        (None, "Its text."),
+        ("https://example.com/", None),
+    ]
+
+
+def test_import_counts_only_inserted_rows(tmp_path, make_config, db):
+    config = make_config(subreddits_csv="bitcoin", import_batch_size=2)
+    path = write_dump(tmp_path / "dump.ndjson", RECORDS)
+
+    assert import_corpus(path, config, db, output=io.StringIO()) == (2, 2)
+
+    path = write_dump(
+        tmp_path / "more.ndjson",
+        RECORDS + [dict(id="c4", subreddit="Bitcoin", created_utc=7, body="New.")],
+    )
+    output = io.StringIO()
+    assert import_corpus(path, config, db, output=output) == (1, 0)
+    assert "1 new comment(s) and 0 new submission(s) of 5 read" in output.getvalue()
+    assert db.query(Comment).count() == 3
+
+
+def test_import_normalizes_bodies_in_worker_processes(tmp_path, make_config, db):
+    config = make_config(subreddits_csv="bitcoin", import_processes=2)
+    records = RECORDS + [
+        dict(
+            id="c4",
+            subreddit="Bitcoin",
+            created_utc=7,
+            body="A &amp; B",
+            body_html="<p>A &amp; B.</p>",
+        )
+    ]
+    path = write_dump(tmp_path / "dump.ndjson", records)
+
+    assert import_corpus(path, config, db, output=io.StringIO()) == (3, 2)
+    assert db.query(Comment).get("c4").body == "A & B."
+    assert db.query(Submission).get("s1").body == "Its text."
@@ -0,0 +1,50 @@
+from sqlalchemy import inspect
+
+from subreddit_simulator.database import Engine, upgrade_schema
+from subreddit_simulator.models import Account, Base, Comment, training_text
+
+
+def create_old_schema(bind):
+    # The comments and accounts tables before sentences / num_tokens and the
+    # access tokens were added, and no cursors / trained_models tables.
+    bind.execute(
+        "CREATE TABLE comments (id VARCHAR(10) PRIMARY KEY, subreddit VARCHAR(21), "
+        "date DATETIME, is_top_level BOOLEAN, author VARCHAR(20), body TEXT, "
+        "score INTEGER, permalink TEXT)"
+    )
+    bind.execute(
+        "INSERT INTO comments VALUES ('c1', 'bitcoin', '2020-01-01 00:00:00', 1, "
+        "'user1', 'An old comment. With two sentences.', 3, '')"
+    )
+    bind.execute(
+        "CREATE TABLE accounts (name VARCHAR(20) PRIMARY KEY, password VARCHAR(50), "
+        "subreddit VARCHAR(21), added DATETIME, can_submit BOOLEAN, "
+        "link_karma INTEGER, num_submissions INTEGER, last_submitted DATETIME, "
+        "can_comment BOOLEAN, comment_karma INTEGER, num_comments INTEGER, "
+        "last_commented DATETIME, num_votes INTEGER, last_voted DATETIME, "
+        "proxy_url VARCHAR(255))"
+    )
+    bind.execute("INSERT INTO accounts (name, subreddit) VALUES ('bot', 'bitcoin')")
+
+
+def test_upgrade_schema_adds_missing_columns_and_keeps_rows(config):
+    bind = Engine.from_config(config).create()
+    create_old_schema(bind)
+
+    upgrade_schema(bind, Base.metadata)
+    upgrade_schema(bind, Base.metadata)
+
+    inspector = inspect(bind)
+    columns = {column["name"] for column in inspector.get_columns("comments")}
+    assert {"sentences", "num_tokens"} <= columns
+    columns = {column["name"] for column in inspector.get_columns("accounts")}
+    assert {"access_token", "token_expires"} <= columns
+    assert {"cursors", "trained_models"} <= set(inspector.get_table_names())
+    indexes = {index["name"] for index in inspector.get_indexes("comments")}
+    assert "ix_comment_subreddit_date" in indexes
+
+    db = Engine.from_config(config).create_session(bind)
+    comment = db.query(Comment).one()
+    assert comment.sentences is None and comment.num_tokens is None
+    assert training_text(comment.body, comment.sentences) == comment.body
+    assert db.query(Account).one().access_token is None
@@ -0,0 +1,154 @@
+from collections import Counter
+
+import pytest
+
+from subreddit_simulator import generation
+from subreddit_simulator.generation import GenerationBudget
+from subreddit_simulator.models import SubredditSimulatorText
+
+TEXTS = {
+    "c1": "The quick brown fox jumps over the lazy dog.",
+    "c2": "A sleepy cat naps in the warm sun all day.",
+}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(generation.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def model(clock, monkeypatch):
+    """Return a model whose chain walks take a second each.
+
+    Every sentence overlaps with the corpus, and all of them are rejected.
+    """
+    model = SubredditSimulatorText.from_texts(TEXTS, state_size=2)
+    walk = model.chain.walk
+
+    def slow_walk(init_state=None):
+        clock[0] += 1
+        return walk(init_state)
+
+    monkeypatch.setattr(model.chain, "walk", slow_walk)
+    monkeypatch.setattr(SubredditSimulatorText, "randomly_accept", staticmethod(bool))
+    return model
+
+
+def test_attempts_are_limited(clock):
+    budget = GenerationBudget(max_attempts=3)
+
+    assert [budget.attempt() for _ in range(4)] == [True, True, True, False]
+    assert budget.exhausted
+    assert (budget.stats.attempts, budget.stats.exhausted) == (3, 1)
+
+
+def test_time_is_limited(clock):
+    budget = GenerationBudget(max_seconds=5.0)
+    assert budget.attempt()
+
+    clock[0] += 4.9
+    assert budget.attempt()
+    clock[0] += 0.1
+    assert budget.elapsed == pytest.approx(5.0)
+    assert not budget.attempt()
+    assert (budget.stats.attempts, budget.stats.exhausted) == (2, 1)
+
+
+def test_zero_limits_are_unlimited(clock):
+    budget = GenerationBudget()
+    clock[0] += 10**6
+
+    assert all(budget.attempt() for _ in range(1000))
+    assert budget.stats.exhausted == 0
+
+
+def test_sentence_attempts_count_in_the_parent_budget(clock):
+    budget = GenerationBudget(max_attempts=5)
+
+    first = budget.sentence(max_attempts=3)
+    assert [first.attempt() for _ in range(4)] == [True, True, True, False]
+    assert (budget.attempts, budget.exhausted) == (3, False)
+
+    # Sentences get what is left of the parent budget.
+    second = budget.sentence(max_attempts=3)
+    assert [second.attempt() for _ in range(3)] == [True, True, False]
+    assert (second.attempts, budget.attempts) == (2, 5)
+    assert budget.exhausted
+    assert budget.stats.attempts == 5
+    assert budget.stats.exhausted == 2
+
+
+def test_sentence_budgets_run_out_with_the_parent_time(clock):
+    budget = GenerationBudget(max_seconds=10.0)
+    clock[0] += 8
+    sentence = budget.sentence(max_seconds=5.0)
+    assert sentence.attempt()
+
+    clock[0] += 2
+    assert sentence.elapsed == 2
+    assert not sentence.attempt()
+
+
+def test_done_records_sentences_failures_and_time(clock):
+    budget = GenerationBudget()
+    sentence = budget.sentence()
+    clock[0] += 1.5
+
+    assert sentence.done("A sentence.") == "A sentence."
+    assert budget.sentence().done(None) is None
+    assert (budget.stats.sentences, budget.stats.failures) == (1, 1)
+    assert budget.stats.seconds == 1.5
+
+
+@pytest.mark.parametrize(
+    "options, reason",
+    [
+        (dict(max_words=1), "too_many_words"),
+        (dict(max_chars=1), "too_long"),
+        (dict(min_chars=1000), "too_short"),
+        (dict(), "overlap"),
+    ],
+)
+def test_rejections_are_counted_by_reason(model, options, reason):
+    budget = GenerationBudget(max_attempts=4)
+
+    assert model.make_sentence(budget=budget, **options) is None
+    assert budget.stats.rejections == Counter({reason: 4})
+    assert (budget.stats.attempts, budget.stats.failures) == (4, 1)
+    assert "rejections: " + reason + "=4" in budget.stats.summary()
+
+
+def test_comments_stop_at_the_attempt_limit(make_config, account, model):
+    account.config = make_config(action_max_attempts=7, sentence_max_attempts=3)
+    account.comment_model = model
+    account.avg_comment_len = 100
+
+    assert account.build_comment() == ""
+
+    stats = account.generation_stats
+    assert (stats.attempts, stats.failures, stats.sentences) == (7, 3, 0)
+    assert stats.exhausted == 3
+    assert stats.rejections == Counter(overlap=7)
+
+
+def test_comments_stop_at_the_time_limit(make_config, account, model, clock):
+    account.config = make_config(
+        action_max_attempts=0,
+        action_max_seconds=10.0,
+        sentence_max_attempts=0,
+        sentence_max_seconds=4.0,
+    )
+    account.comment_model = model
+    account.avg_comment_len = 100
+
+    assert account.build_comment() == ""
+
+    # Sentences get 4 seconds each, until 10 seconds were spent overall.
+    stats = account.generation_stats
+    assert (stats.attempts, stats.failures) == (10, 3)
+    assert stats.seconds == 10
+    assert stats.exhausted == 3
+    assert stats.rejections == Counter(overlap=10)
@@ -0,0 +1,83 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+CURSOR_DATE = datetime(2020, 1, 1)
+
+
+def make_submission(id, created):
+    return SimpleNamespace(
+        id=id,
+        fullname=f"t3_{id}",
+        subreddit=SimpleNamespace(display_name="Bitcoin"),
+        created_utc=(created - datetime(1970, 1, 1)).total_seconds(),
+        author=None,
+        title=f"Submission {id}",
+        is_self=False,
+        url="https://example.com/",
+        score=1,
+        over_18=False,
+        permalink="",
+    )
+
+
+class Listings:
+    def __init__(self, new=(), top=()):
+        self.listings = dict(new=new, top=top)
+        self.calls = []
+
+    def new(self, limit):
+        self.calls.append(("new", limit))
+        return iter(self.listings["new"])
+
+    def top(self, time_filter, limit):
+        self.calls.append(("top", limit))
+        return iter(self.listings["top"])
+
+
+def fetch(account, listings, cursor):
+    session = SimpleNamespace(subreddit=lambda name: listings)
+    return [s.id for s in account.fetch_submissions(session, cursor, limit=10)]
+
+
+def test_submissions_catch_up_from_the_new_listing(make_config, account):
+    account.config = make_config(catch_up_limit=500)
+    listings = Listings(
+        new=[
+            make_submission("s3", datetime(2020, 1, 3)),
+            make_submission("s2", datetime(2020, 1, 2)),
+            make_submission("s1", CURSOR_DATE),
+            make_submission("s0", datetime(2019, 12, 31)),
+        ],
+        # A high scoring older submission first would stop a top listing.
+        top=[make_submission("s1", CURSOR_DATE)],
+    )
+
+    assert fetch(account, listings, ("t3_s1", CURSOR_DATE)) == ["s3", "s2"]
+    assert listings.calls == [("new", 500)]
+
+
+def test_first_fetch_uses_the_top_listing(account):
+    listings = Listings(top=[make_submission("s1", CURSOR_DATE)])
+
+    assert fetch(account, listings, None) == ["s1"]
+    assert listings.calls == [("top", 10)]
+
+
+@pytest.mark.parametrize(
+    "cursor, fetches", [(None, ["day", "all"]), (("t3_s1", CURSOR_DATE), ["day"])]
+)
+def test_new_listing_is_fetched_once(account, monkeypatch, cursor, fetches):
+    calls = []
+    monkeypatch.setattr(account, "get_cursor", lambda kind: cursor)
+    monkeypatch.setattr(
+        account,
+        "get_submissions_from_site",
+        lambda top_of: calls.append(top_of) or [],
+    )
+    monkeypatch.setattr(account, "get_submissions_for_training", lambda: [])
+    monkeypatch.setattr(account, "train", lambda jobs: True)
+
+    assert account.train_from_submissions()
+    assert calls == fetches
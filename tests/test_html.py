@@ -0,0 +1,114 @@
+import html
+import html.parser
+import random
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import product
+
+import pytest
+
+from subreddit_simulator import models
+from subreddit_simulator.models import (
+    HTMLNormalizer,
+    SubredditSimulatorText,
+    normalize_html_text,
+    normalize_html_texts,
+)
+
+EDGE_CASES = [
+    None,
+    "",
+    "   \n ",
+    "plain text without markup",
+    "<p>one</p><p>two.</p>",
+    "a < b and c > d",
+    "unterminated <a href='x",
+    "&lt;p&gt;escaped markup&lt;/p&gt;",
+    "&amp;amp; &#39;quotes&#39; &quot;double&quot; &nbsp;",
+    "<!-- comment --><p>after</p>",
+    "<script>var x = '<p>';</script>text",
+    "<p>Ünïcödé ✓ 🙂</p>",
+    "line one\nline two\n\nline three",
+]
+
+BLOCKS = [
+    "<p>First paragraph with <em>emphasis</em> and <strong>bold</strong></p>",
+    '<p>See <a href="https://example.com/?a=1&amp;b=2">this link</a>!</p>',
+    "<blockquote><p>a quoted reply</p></blockquote>",
+    "<ul><li>one item</li><li>another, item;</li></ul>",
+    "<pre><code>x = 1\ny = 2</code></pre>",
+    "<p>5 &lt; 6 &amp;&amp; 7 &gt; 3</p>",
+    "<table><tr><td>cell</td><td>other cell</td></tr></table>",
+    '<div class="md"><p>wrapped in a div</p>\n</div>',
+]
+
+
+def fixture_corpus():
+    yield from EDGE_CASES
+    for first, second, third in product(BLOCKS, repeat=3):
+        yield f'<div class="md">{first}\n\n{second}{third}</div>'
+        yield f"{first} trailing text"
+
+
+def reference_normalize_html_text(html_text):
+    # normalize_html_text() before HTMLNormalizer, one parser per text.
+    if not html_text or not html_text.strip():
+        return ""
+    body = []
+
+    class Parser(html.parser.HTMLParser):
+        def handle_data(self, data):
+            body.append(SubredditSimulatorText.prepare_sentance(data))
+
+    p = Parser()
+    p.feed(html.unescape(html_text))
+    p.close()
+    text = " ".join(map(str.strip, body))
+    return SubredditSimulatorText.prepare_sentance(text)
+
+
+def test_normalizer_matches_reference_on_fixture_corpus():
+    normalizer = HTMLNormalizer()
+    for html_text in fixture_corpus():
+        # The same punctuation is picked when a sentence lacks one.
+        random.seed(html_text)
+        expected = reference_normalize_html_text(html_text)
+        random.seed(html_text)
+        assert normalizer.normalize(html_text) == expected, html_text
+        random.seed(html_text)
+        assert normalize_html_text(html_text) == expected, html_text
+
+
+def test_each_thread_has_its_own_normalizer():
+    normalizers = []
+
+    def normalize():
+        normalize_html_text("<p>text.</p>")
+        normalizers.append(models.normalizers.normalizer)
+
+    threads = [threading.Thread(target=normalize) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert normalizers[0] is not normalizers[1]
+
+
+def any_punctuation(text):
+    # Missing punctuation is picked at random, in each worker process.
+    return re.sub(r"[.!?]", ".", text)
+
+
+@pytest.mark.parametrize("processes", [0, 2])
+def test_batch_normalization_matches_normalizer(processes):
+    html_texts = list(fixture_corpus())
+
+    with ProcessPoolExecutor(processes) if processes else nullcontext() as executor:
+        normalized = normalize_html_texts(html_texts, executor)
+
+    assert list(map(any_punctuation, normalized)) == [
+        any_punctuation(normalize_html_text(html_text)) for html_text in html_texts
+    ]
@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+import praw
+
+from subreddit_simulator.listings import ListingCache
+
+
+def make_items(reddit):
+    comment = praw.models.Comment(
+        reddit,
+        _data={
+            "id": "c1",
+            "author": "user1",
+            "subreddit": "Bitcoin",
+            "body": "Hello there.",
+            "link_id": "t3_s1",
+            "parent_id": "t3_s1",
+        },
+    )
+    submission = praw.models.Submission(
+        reddit,
+        _data={
+            "id": "s1",
+            "author": "user2",
+            "subreddit": "Bitcoin",
+            "title": "A title",
+            "num_comments": 1,
+        },
+    )
+    return comment, submission
+
+
+def test_bind_rebuilds_items_for_another_session(make_reddit, no_network):
+    first, second = make_reddit("first"), make_reddit("second")
+    cache = ListingCache(SimpleNamespace(listing_cache_seconds=60))
+
+    for item in make_items(first):
+        bound = cache.bind(item, second)
+
+        assert type(bound) is type(item)
+        assert bound._reddit is second
+        assert bound.id == item.id
+        assert bound.author._reddit is second
+        assert bound.author.name == item.author.name
+        assert bound.subreddit._reddit is second
+        assert bound.subreddit.display_name == "Bitcoin"
+
+
+def test_bind_keeps_items_of_the_same_session(make_reddit, no_network):
+    reddit = make_reddit()
+    cache = ListingCache(SimpleNamespace(listing_cache_seconds=60))
+
+    for item in make_items(reddit):
+        assert cache.bind(item, reddit) is item
+
+
+def test_get_serves_cached_listing_to_other_sessions(make_reddit, no_network):
+    first, second = make_reddit("first"), make_reddit("second")
+    items = make_items(first)
+    calls = []
+
+    class Listings:
+        def new(self, limit):
+            calls.append(limit)
+            return iter(items)
+
+    first.subreddit = lambda name: Listings()
+    cache = ListingCache(SimpleNamespace(listing_cache_seconds=60))
+
+    assert cache.get(first, "bitcoin", "new", limit=10) == list(items)
+    cached = cache.get(second, "bitcoin", "new", limit=10)
+
+    assert calls == [10]
+    assert [item._reddit for item in cached] == [second, second]
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,163 @@
+import os
+import time
+
+import pytest
+
+from subreddit_simulator import model_store
+from subreddit_simulator.models import (
+    SubredditSimulatorText,
+    TrainedModel,
+    corpus_fingerprint,
+)
+
+TEXTS = {
+    "c1": "The cat sat on the mat. The dog sat on the rug.",
+    "c2": "A bird flew over the house. The cat saw the bird.",
+}
+
+
+def get_model(account, texts, **stats):
+    # Start from an empty in-memory cache, like a freshly started process
+    # after the previous one saved its models, with the stats set like
+    # train() does.
+    account.save_models()
+    account._models = {}
+    for name, value in stats.items():
+        setattr(account, name, value)
+    return account.get_model("comment", 2, texts, **stats)
+
+
+def test_updated_model_is_cached_with_current_stats(account, db, monkeypatch):
+    get_model(account, TEXTS, avg_comment_len=10)
+
+    texts = dict(TEXTS, c3="The fox ran into the woods.")
+    model = get_model(account, texts, avg_comment_len=20)
+
+    assert set(model.runs) == set(texts)
+    assert account.avg_comment_len == 20
+
+    assert account.save_models() == 1
+    cached = db.query(TrainedModel).one()
+    assert cached.fingerprint == corpus_fingerprint(2, texts)
+    assert cached.stats == {"avg_comment_len": 20}
+
+    def train(*args, **kwargs):
+        raise AssertionError("model trained again")
+
+    monkeypatch.setattr(SubredditSimulatorText, "from_runs", train)
+    monkeypatch.setattr(SubredditSimulatorText, "update", train)
+    account.avg_comment_len = None
+    model = get_model(account, texts)
+
+    assert model.overlap_index.contains(["The", "fox", "ran"])
+    assert account.avg_comment_len == 20
+
+
+@pytest.mark.parametrize("incremental_training", [True, False])
+def test_stale_cached_stats_are_not_restored(
+    make_config, account, incremental_training
+):
+    account.config = make_config(incremental_training=incremental_training)
+    get_model(account, TEXTS, avg_comment_len=10)
+
+    get_model(account, {"c1": TEXTS["c1"]}, avg_comment_len=20)
+
+    assert account.avg_comment_len == 20
+
+
+def test_stored_models_are_updated_incrementally(
+    make_config, account, monkeypatch, tmp_path
+):
+    store = tmp_path / "models"
+    account.config = make_config(model_store_dir=str(store))
+    get_model(account, TEXTS, avg_comment_len=10)
+    (old_file,) = store.iterdir()
+
+    def train(*args, **kwargs):
+        raise AssertionError("model trained from scratch")
+
+    monkeypatch.setattr(SubredditSimulatorText, "from_texts", train)
+    texts = dict(TEXTS, c3="The fox ran into the woods.")
+    model = get_model(account, texts, avg_comment_len=20)
+
+    (new_file,) = store.iterdir()
+    assert new_file != old_file
+    assert corpus_fingerprint(2, texts) in new_file.name
+    assert model.runs is None
+    assert model.overlap_index.contains(["The", "fox", "ran"])
+
+
+def test_model_files_are_written_atomically(monkeypatch, tmp_path):
+    path = tmp_path / "bitcoin-comment-2-fp.model"
+    model = SubredditSimulatorText.from_texts(TEXTS)
+    mapped = model_store.write_model_file(path, model_store.model_bytes(model))
+
+    # The returned mapping outlives the file being removed by another process.
+    path.unlink()
+    assert SubredditSimulatorText.from_mapped(*mapped).overlap_index.contains(
+        ["The", "cat", "sat"]
+    )
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(model_store.os, "replace", fail)
+    with pytest.raises(OSError):
+        model_store.write_model_file(path, model_store.model_bytes(model))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_store_model_keeps_newer_files(account, make_config, tmp_path):
+    store = tmp_path / "models"
+    account.config = make_config(model_store_dir=str(store))
+    store.mkdir()
+    older = store / "bitcoin-comment-2-older.model"
+    newer = store / "bitcoin-comment-2-newer.model"
+    older.touch()
+    newer.touch()
+    os.utime(older, (0, 0))
+    os.utime(newer, (time.time() + 60,) * 2)
+
+    path = account.model_path("comment", 2, "current")
+    account.store_model("comment", path, SubredditSimulatorText.from_texts(TEXTS))
+
+    assert sorted(store.iterdir()) == sorted([path, newer])
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_model_bytes_load_without_training(compact):
+    model = SubredditSimulatorText.from_texts(TEXTS)
+    if compact:
+        model.compact()
+
+    loaded = SubredditSimulatorText.from_bytes(model_store.model_bytes(model))
+
+    assert loaded.state_size == 2
+    assert loaded.chain.model == model.chain.model
+    assert all(
+        loaded.overlap_index.contains(run)
+        for text in TEXTS.values()
+        for run in SubredditSimulatorText.parse(text)
+    )
+    assert model_store.model_bytes(loaded) == model_store.model_bytes(model)
+
+
+@pytest.mark.parametrize("compact_models", [False, True])
+def test_updated_models_are_saved_later(make_config, account, db, compact_models):
+    account.config = make_config(compact_models=compact_models)
+    account.get_model("comment", 2, TEXTS)
+    assert account.save_models() == 1
+    saved = db.query(TrainedModel).one().trained
+
+    for i in range(3):
+        texts = dict(TEXTS, **{f"c{3 + i}": f"The fox ran {i} times away."})
+        model = account.get_model("comment", 2, texts)
+        assert model.overlap_index.contains(["ran", str(i), "times"])
+    db.expire_all()
+    assert db.query(TrainedModel).one().trained == saved
+
+    assert account.save_models() == 1
+    assert account.save_models() == 0
+    cached = db.query(TrainedModel).one()
+    assert cached.fingerprint == corpus_fingerprint(2, texts)
+    assert sorted(cached.runs) == ["c1", "c2", "c5"]
@@ -0,0 +1,80 @@
+from itertools import count
+from types import SimpleNamespace
+
+from subreddit_simulator import pools
+from subreddit_simulator.pools import SentencePool
+
+
+def make_pool(size=3):
+    return SentencePool(
+        SimpleNamespace(
+            sentence_pool_size=size,
+            sentence_pool_refill_seconds=5.0,
+            sentence_max_attempts=10,
+            sentence_max_seconds=1.0,
+        )
+    )
+
+
+def generator(prefix):
+    numbers = count()
+    return lambda budget: f"{prefix} {next(numbers)}"
+
+
+def test_previous_sentences_are_served_until_the_new_model_has_some():
+    pool = make_pool()
+    pool.register("bitcoin", "comment", "old", generator("old"))
+    pool.fill()
+
+    pool.register("bitcoin", "comment", "new", generator("new"))
+    assert pool.take("bitcoin", "comment", "new") == "old 0"
+    assert pool.take("bitcoin", "comment", "old") is None
+
+    pool.fill()
+    assert [pool.take("bitcoin", "comment", "new") for _ in range(4)] == [
+        "new 0",
+        "new 1",
+        "new 2",
+        None,
+    ]
+
+
+def test_registering_the_same_model_keeps_its_sentences():
+    pool = make_pool()
+    pool.register("bitcoin", "comment", "same", generator("first"))
+    pool.fill()
+    pool.register("bitcoin", "comment", "same", generator("second"))
+
+    assert pool.take("bitcoin", "comment", "same") == "first 0"
+
+
+def test_failing_models_are_retried_with_backoff(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(pools.time, "monotonic", lambda: now[0])
+    calls = []
+
+    def degenerate(budget):
+        calls.append(now[0])
+        return None
+
+    pool = make_pool()
+    pool.register("bitcoin", "title", "fp", degenerate)
+    for _ in range(3):
+        pool.fill()
+    assert len(calls) == 1
+
+    now[0] += 5
+    pool.fill()
+    pool.fill()
+    assert len(calls) == 2
+
+    now[0] += 5
+    pool.fill()
+    assert len(calls) == 2
+    now[0] += 5
+    pool.fill()
+    assert len(calls) == 3
+
+    pool.register("bitcoin", "title", "new", generator("title"))
+    pool.fill()
+    assert pool.take("bitcoin", "title", "new") == "title 0"
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from subreddit_simulator.models import Comment
+from subreddit_simulator.retention import prune_corpus, retention_cutoff
+
+NOW = datetime(2020, 1, 1)
+
+
+@pytest.fixture
+def comments(db):
+    # From newest to oldest: an ignored user's and an empty comment, then
+    # four 10-token comments.
+    rows = [
+        dict(id="ignored", author="spammer", body="Buy now.", num_tokens=10),
+        dict(id="empty", author="user", body="", num_tokens=0),
+        *(
+            dict(id=f"c{i}", author="user", body="Some text.", num_tokens=10)
+            for i in range(4)
+        ),
+    ]
+    db.execute(
+        Comment.__table__.insert(),
+        [
+            dict(row, subreddit="bitcoin", date=NOW - timedelta(days=i))
+            for i, row in enumerate(rows)
+        ],
+    )
+    db.commit()
+
+
+def remaining(db):
+    return sorted(id for id, in db.query(Comment.id))
+
+
+def test_only_rows_eligible_for_training_count_toward_the_corpus(
+    make_config, db, comments
+):
+    config = make_config(retention_rows=1, max_corpus_size=2, ignored_users="spammer")
+
+    assert retention_cutoff(db, Comment, "bitcoin", config) == NOW - timedelta(days=3)
+    prune_corpus(config, db)
+
+    assert remaining(db) == ["c0", "c1", "empty", "ignored"]
+
+
+def test_training_token_budget_is_kept(make_config, db, comments):
+    config = make_config(
+        retention_rows=1,
+        max_corpus_size=1,
+        training_token_budget=30,
+        ignored_users="spammer",
+    )
+
+    prune_corpus(config, db)
+
+    assert remaining(db) == ["c0", "c1", "c2", "empty", "ignored"]
+
+
+def test_nothing_is_pruned_while_the_corpus_is_not_full(make_config, db, comments):
+    config = make_config(retention_rows=1, max_corpus_size=6)
+
+    assert retention_cutoff(db, Comment, "bitcoin", config) is None
+    config = make_config(retention_rows=1, training_token_budget=1000)
+    assert retention_cutoff(db, Comment, "bitcoin", config) is None
@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from subreddit_simulator import seen
+from subreddit_simulator.models import Comment
+from subreddit_simulator.seen import SeenIdIndex
+
+START = datetime(2020, 1, 1)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [START]
+
+    class FakeDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return now[0]
+
+    monkeypatch.setattr(seen, "datetime", FakeDatetime)
+    return now
+
+
+def store(db, index, *rows):
+    db.execute(
+        Comment.__table__.insert(),
+        [dict(id=id, subreddit="bitcoin", date=date, body="") for id, date in rows],
+    )
+    db.commit()
+    index.add(Comment, "bitcoin", [id for id, _ in rows])
+
+
+def row(id, date):
+    return SimpleNamespace(id=id, date=date)
+
+
+@pytest.mark.parametrize("bloom_capacity", [0, 100])
+def test_window_slides_and_old_ids_are_dropped(db, clock, bloom_capacity):
+    index = SeenIdIndex(
+        SimpleNamespace(seen_ids_window_days=8, seen_ids_bloom_capacity=bloom_capacity)
+    )
+    old_date = START - timedelta(days=7, hours=12)
+    store(db, index, ("old", old_date))
+    since, ids = index.index(db, Comment, "bitcoin")
+    assert since == START - timedelta(days=8)
+    assert "old" in ids
+
+    clock[0] = START + timedelta(days=1)
+    since, ids = index.index(db, Comment, "bitcoin")
+    assert since == START - timedelta(days=7)
+    assert "old" in ids
+
+    # Rows older than the slid window are looked up in the database.
+    rows = [row("old", old_date), row("other", old_date)]
+    assert [r.id for r in index.new_rows(db, Comment, "bitcoin", rows)] == ["other"]
+
+    # Once the window slid by a quarter, the IDs are loaded again.
+    clock[0] = START + timedelta(days=2, seconds=1)
+    since, ids = index.index(db, Comment, "bitcoin")
+    assert "old" not in ids
+    assert [r.id for r in index.new_rows(db, Comment, "bitcoin", rows)] == ["other"]
+
+
+def test_ids_are_kept_without_window(db, clock):
+    index = SeenIdIndex(
+        SimpleNamespace(seen_ids_window_days=0, seen_ids_bloom_capacity=0)
+    )
+    store(db, index, ("old", START - timedelta(days=100)))
+    index.index(db, Comment, "bitcoin")
+
+    clock[0] = START + timedelta(days=1000)
+    since, ids = index.index(db, Comment, "bitcoin")
+    assert since is None
+    assert "old" in ids
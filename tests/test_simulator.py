@@ -0,0 +1,214 @@
+import io
+import threading
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import praw
+import prawcore
+import pytest
+import requests
+
+from subreddit_simulator.compact import CompactChain
+from subreddit_simulator.models import Account, Comment, TrainedModel
+from subreddit_simulator.subreddit_simulator import Simulator
+
+COMMENTS = [
+    "The cat sat on the mat. The dog sat on the rug.",
+    "A bird flew over the house. The cat saw the bird.",
+    "The fox ran into the woods. The bird flew away.",
+]
+
+
+def make_simulator(config):
+    simulator = Simulator.__new__(Simulator)
+    simulator.config = config
+    simulator.accounts = {}
+    simulator.output = io.StringIO()
+    return simulator
+
+
+def test_harvest_uses_at_least_one_thread(make_config):
+    simulator = make_simulator(make_config(harvest_threads=0))
+
+    assert simulator.harvest() == (
+        True,
+        "0 account(s): 0 new comment(s), 0 new submission(s)",
+    )
+
+
+def add_comments(db, subreddit, texts):
+    now = datetime.utcnow()
+    db.execute(
+        Comment.__table__.insert(),
+        [
+            dict(
+                id=f"{subreddit}{i}",
+                subreddit=subreddit,
+                date=now - timedelta(hours=i),
+                body=text,
+            )
+            for i, text in enumerate(texts)
+        ],
+    )
+    db.commit()
+
+
+def test_models_trained_in_workers_are_loaded_without_rebuilding(
+    make_config, account, db
+):
+    simulator = make_simulator(make_config(training_processes=2))
+    account.config = simulator.config
+    account.can_submit = False
+    simulator.accounts = {account.name: account}
+    add_comments(db, "bitcoin", COMMENTS)
+
+    assert simulator.train_models() == (True, "1 account(s)")
+
+    model = account.comment_model
+    assert isinstance(model.chain, CompactChain)
+    assert model.overlap_index.contains(["The", "fox", "ran"])
+    cached = db.query(TrainedModel).one()
+    assert sorted(cached.runs) == ["bitcoin0", "bitcoin1", "bitcoin2"]
+
+    # The next training reuses the cached model.
+    account._models = {}
+    assert simulator.train_models() == (True, "1 account(s)")
+    assert simulator.output.getvalue().splitlines()[-1] == (
+        "Training 0 model(s) (reusing 1) in worker processes..."
+    )
+    assert isinstance(account.comment_model.chain, CompactChain)
+
+
+def make_session(me):
+    def get_me(use_cache):
+        if isinstance(me, Exception):
+            raise me
+        return me
+
+    return SimpleNamespace(user=SimpleNamespace(me=get_me))
+
+
+def test_harvest_reports_accounts_failing_to_log_in(
+    make_config, account, engine, db, monkeypatch
+):
+    simulator = make_simulator(make_config())
+    # A session in use isn't refreshed.
+    account._session = make_session(AssertionError("session refreshed"))
+    me = SimpleNamespace(link_karma=1, comment_karma=2)
+    accounts = [account]
+    for name, name_me in [("failing", requests.ConnectionError("down")), ("new", me)]:
+        other = Account(name, "password", name, config=simulator.config, engine=engine)
+        other.db = db
+        other.login = lambda me=name_me: make_session(me)
+        accounts.append(other)
+    simulator.accounts = {account.name: account for account in accounts}
+
+    fetched, used = [], {}
+    monkeypatch.setattr(
+        Account,
+        "fetch_comments",
+        lambda self, session, cursor: fetched.append(self.name) or [],
+    )
+    monkeypatch.setattr(Account, "fetch_submissions", lambda *args: [])
+    monkeypatch.setattr(
+        Account, "use_session", lambda self, session, me: used.update({self.name: me})
+    )
+
+    assert simulator.harvest() == (False, "Cannot harvest with 1 of 3 account(s)!")
+    assert sorted(fetched) == ["bot", "new"]
+    assert used == {"new": me}
+
+
+@pytest.fixture
+def login_accounts(make_config, account, engine, db, make_reddit, monkeypatch):
+    """Return a function logging in "bot", "ok" and "failing" accounts.
+
+    Sessions are real praw ones, but user.me() is answered without any
+    request, and fails for the "failing" account.
+    """
+    threads = {}
+
+    def me(self, use_cache=True):
+        name = self._reddit.config.username
+        threads[name] = threading.get_ident()
+        if name == "failing":
+            raise prawcore.exceptions.RequestException(
+                requests.ConnectionError("down"), (), {}
+            )
+        self._reddit._core._rate_limiter.update(
+            {
+                "x-ratelimit-remaining": "599",
+                "x-ratelimit-used": "1",
+                "x-ratelimit-reset": "600",
+            }
+        )
+        return SimpleNamespace(name=name, link_karma=1, comment_karma=2)
+
+    monkeypatch.setattr(praw.models.User, "me", me)
+    monkeypatch.setattr(Account, "login", lambda self: make_reddit(self.name))
+
+    def login_accounts(**config):
+        simulator = make_simulator(make_config(**config))
+        account.config = simulator.config
+        simulator.accounts = {"bot": account}
+        for name in ("ok", "failing"):
+            other = Account(
+                name, "password", name, config=simulator.config, engine=engine
+            )
+            other.db = db
+            db.add(other)
+            simulator.accounts[name] = other
+        db.commit()
+
+        simulator.login_accounts()
+        return simulator, threads
+
+    return login_accounts
+
+
+def logged_in(accounts):
+    return sorted(
+        name
+        for name, account in accounts.items()
+        if getattr(account, "_session", None) is not None
+    )
+
+
+@pytest.mark.usefixtures("no_network")
+def test_accounts_log_in_sequentially(login_accounts):
+    simulator, threads = login_accounts(login_mode="sequential")
+
+    assert logged_in(simulator.accounts) == ["bot", "ok"]
+    assert simulator.accounts["ok"].comment_karma == 2
+    assert "Cannot log in as failing" in simulator.output.getvalue()
+    assert len(set(threads.values())) == 1
+
+
+@pytest.mark.usefixtures("no_network")
+def test_accounts_log_in_concurrently(login_accounts, monkeypatch):
+    # Both accounts wait for the other, so they must log in at the same time.
+    barrier = threading.Barrier(2, timeout=5)
+    me = praw.models.User.me
+
+    def wait_for_other(self, use_cache=True):
+        if self._reddit.config.username != "failing":
+            barrier.wait()
+        return me(self, use_cache)
+
+    monkeypatch.setattr(praw.models.User, "me", wait_for_other)
+
+    simulator, threads = login_accounts(login_mode="concurrent", login_threads=3)
+
+    assert logged_in(simulator.accounts) == ["bot", "ok"]
+    assert "Cannot log in as failing" in simulator.output.getvalue()
+    assert threads["bot"] != threads["ok"]
+
+
+@pytest.mark.usefixtures("no_network")
+def test_accounts_log_in_lazily(login_accounts):
+    simulator, threads = login_accounts(login_mode="lazy")
+
+    assert logged_in(simulator.accounts) == []
+    assert threads == {}
+    assert simulator.accounts["ok"].session.user.me().name == "ok"
+    assert logged_in(simulator.accounts) == ["ok"]
@@ -0,0 +1,73 @@
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import Text
+
+from subreddit_simulator.models import Account, SessionToken
+
+LONG_TOKEN = "t" * 1000
+
+
+def test_stored_token_is_reused_without_password_grant(account, db, no_network):
+    account.access_token = LONG_TOKEN
+    account.token_expires = time.time() + 3600
+    db.commit()
+
+    session = account.login()
+
+    assert session._core._set_header_callback() == {
+        "Authorization": f"bearer {LONG_TOKEN}"
+    }
+
+
+def test_expired_token_is_not_reused(account, no_network):
+    account.access_token = "expired"
+    account.token_expires = time.time() - 1
+
+    assert not account.restore_token(account.login())
+    assert SessionToken(account.login()).get() == (None, None)
+
+
+def test_new_token_is_stored(account, db, no_network):
+    account._session = account.login()
+    expires = time.time() + 100
+    SessionToken(account._session).set(LONG_TOKEN, expires)
+
+    assert account.store_token()
+    assert not account.store_token()
+    db.commit()
+    db.expire_all()
+
+    assert isinstance(Account.__table__.c.access_token.type, Text)
+    assert (account.access_token, account.token_expires) == (LONG_TOKEN, expires)
+    assert account.token_expiring(300)
+    assert not account.token_expiring(50)
+
+
+def test_renew_token(account, no_network, monkeypatch):
+    account._session = account.login()
+    authorizer = account._session._core._authorizer
+
+    def refresh():
+        authorizer.access_token = "renewed"
+        authorizer._expiration_timestamp = time.time() + 3600
+
+    monkeypatch.setattr(authorizer, "refresh", refresh)
+    account.renew_token()
+
+    assert account.store_token()
+    assert account.access_token == "renewed"
+    assert not account.token_expiring(300)
+
+
+def test_unknown_prawcore_internals_fail_safely(account):
+    session = SimpleNamespace(_core=SimpleNamespace(_authorizer=object()))
+    account.access_token = "token"
+    account.token_expires = time.time() + 3600
+    account._session = session
+
+    assert SessionToken(session).get() == (None, None)
+    assert not account.restore_token(session)
+    assert not account.store_token()
+    assert not account.token_expiring(300)
+    account.renew_token()
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from subreddit_simulator.models import Submission
+
+SUBMISSIONS = [
+    dict(id="s1", over_18=False, url="https://example.com/", body=None),
+    dict(id="s2", over_18=None, url=None, body="A self post. " * 10),
+    dict(id="s3", over_18=True, url=None, body="An NSFW post."),
+    dict(id="s4", over_18=None, url="https://example.org/", body=None),
+]
+
+
+@pytest.fixture
+def submissions(db):
+    now = datetime.utcnow()
+    db.execute(
+        Submission.__table__.insert(),
+        [
+            dict(
+                data,
+                subreddit="bitcoin",
+                date=now - timedelta(hours=i),
+                author="user",
+                title=f"Title number {i}",
+                score=1,
+            )
+            for i, data in enumerate(SUBMISSIONS)
+        ],
+    )
+    db.commit()
+
+
+@pytest.mark.parametrize("training_token_budget", [0, 1000])
+def test_submissions_without_nsfw_flag_are_trained_on(
+    make_config, account, submissions, training_token_budget
+):
+    account.config = make_config(training_token_budget=training_token_budget)
+
+    rows = account.get_submissions_for_training()
+
+    assert not isinstance(rows, list)
+    assert sorted(row.id for row in rows) == ["s1", "s2", "s4"]
+
+
+def test_training_jobs_read_streamed_rows_once(account, submissions):
+    jobs = account.submission_training_jobs(account.get_submissions_for_training())
+
+    (_, _, titles, stats), (_, _, selftexts, _) = jobs
+    assert sorted(titles) == ["s1", "s2", "s4"]
+    assert list(selftexts) == ["s2"]
+    assert sorted(row.id for row in account.link_submissions) == ["s1", "s4"]
+    assert stats == {"link_submission_chance": 2 / 3}
+
+
+def test_link_submissions_without_url_are_not_trained_on(account, db):
+    db.execute(
+        Submission.__table__.insert(),
+        [
+            dict(
+                id="s9",
+                subreddit="bitcoin",
+                date=datetime.utcnow(),
+                author="user",
+                title="A removed link",
+                score=1,
+            )
+        ],
+    )
+    db.commit()
+
+    jobs = account.submission_training_jobs(account.get_submissions_for_training())
+
+    assert [(kind, list(texts)) for kind, _, texts, _ in jobs] == [("title", ["s9"])]